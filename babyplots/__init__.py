@@ -1 +1,3 @@
-from babyplots.babyplots import Babyplot
\ No newline at end of file
+from babyplots.babyplots import Babyplot, init_notebook
+from babyplots.batch import export_many
+from babyplots.encoding import set_json_backend
\ No newline at end of file
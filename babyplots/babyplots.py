@@ -8,24 +8,128 @@ https://bp.bleb.li/documentation/python
 """
 
 import os
-from functools import reduce
-from typing import Union, List
+import sys
+from collections import deque
+from operator import itemgetter
+from typing import IO, Callable, Union, List, Tuple
+from contextlib import contextmanager
+from time import perf_counter
 from uuid import uuid4
-import json
 import numpy as np
-import pandas as pd
-from skimage import io
-from skimage.util import img_as_float
-from IPython.display import HTML, Javascript, display
-import jinja2
+from concurrent.futures import ThreadPoolExecutor
+from babyplots.encoding import (
+    COMPRESSION_FORMATS, as_typed_array, buffer_encoder, compress,
+    decode_runs, dequantize, dumps, encode_array, encode_buffers,
+    encode_categories, quantize, round_significant, run_length
+)
+from babyplots.container import load_container, save_container
+from babyplots.gltf import glb_string, mesh_string
+from babyplots.grid import (
+    GRID_PLOT_TYPES, as_grid, block_centers, block_labels, block_means,
+    block_starts, grid_size, pivot_plot
+)
+from babyplots.image import read_thresholded_stack
+from babyplots.keyframes import pack_keyframes
+from babyplots.live import LiveFigure
+from babyplots.lod import (
+    downsample, dropped_per_category, progressive_chunks, progressive_order
+)
+from babyplots.meshstream import pack_frames
+from babyplots.shared import SharedArrays
+from babyplots.sidecar import data_server, pack_plot, write_sidecar
 
 
 dirname = os.path.dirname(
     os.path.realpath(__file__)
 )
 
-t_loader = jinja2.FileSystemLoader(os.path.join(dirname, 'templates'))
-JENV = jinja2.Environment(loader=t_loader)
+# sources of the plot data of notebook displays, see Babyplot()
+DATA_MODES = ("inline", "sidecar", "server")
+
+# text of the babyplots javascript library, loaded on first use
+_BPJS = None
+# compressed (base64) library text per compression format
+_BPJS_COMPRESSED = {}
+# set once the library was injected into the current notebook kernel session
+_NOTEBOOK_INITIALIZED = False
+# jinja2 environment of the templates, created on first use
+_JENV = None
+
+
+def _template(name: str):
+    """Returns a template of the templates directory.
+
+    jinja2 is only imported, and the environment only created, when the
+    first template is needed.
+
+    """
+    global _JENV
+    if _JENV is None:
+        import jinja2
+
+        loader = jinja2.FileSystemLoader(os.path.join(dirname, 'templates'))
+        _JENV = jinja2.Environment(loader=loader)
+        _JENV.policies["json.dumps_function"] = dumps
+        _JENV.policies["json.dumps_kwargs"] = {"sort_keys": True}
+    return _JENV.get_template(name)
+
+
+def _load_bpjs() -> str:
+    """Returns the text of the babyplots javascript library.
+
+    The file is only read from disk once per process.
+
+    """
+    global _BPJS
+    if _BPJS is None:
+        bpjs_file = os.path.join(
+            dirname,
+            'js/babyplots.js'
+        )
+        with open(bpjs_file, 'r', encoding="utf-8") as infile:
+            _BPJS = infile.read()
+    return _BPJS
+
+
+def _load_bpjs_compressed(compression: str) -> str:
+    """Returns the compressed, base64 encoded babyplots javascript library."""
+    if compression not in _BPJS_COMPRESSED:
+        _BPJS_COMPRESSED[compression] = compress(
+            _load_bpjs().encode("utf-8"), compression)
+    return _BPJS_COMPRESSED[compression]
+
+
+def init_notebook(force: bool = False):
+    """Loads the babyplots javascript library into the Jupyter notebook.
+
+    The library is registered as the RequireJS module 'Baby' only once per
+    kernel session; later calls (and later Babyplot objects) reuse it. This
+    is called automatically when a Babyplot object is created.
+
+    Parameters
+    ---
+    force: Inject the library again, even if it was already loaded in this
+    kernel session (e.g. after clearing all cell outputs).
+
+    """
+    global _NOTEBOOK_INITIALIZED
+    if _NOTEBOOK_INITIALIZED and not force:
+        return
+    # outside of IPython (e.g. in scripts exporting html files) there is no
+    # notebook to load the library into
+    if "IPython" not in sys.modules:
+        return
+    from IPython import get_ipython
+    from IPython.display import Javascript, display
+
+    if get_ipython() is None:
+        return
+    bpjs = "define('Baby', [], function() {{{0}\nreturn Baby;}})".format(
+        _load_bpjs())
+    # receiver of live updates, see Babyplot.live()
+    live = _template('live.js').render()
+    display(Javascript(bpjs + ";\n" + live))
+    _NOTEBOOK_INITIALIZED = True
 
 
 class Babyplot(object):
@@ -49,7 +153,14 @@ class Babyplot(object):
         z_scale: float = 1,
         shape_legend_title: str = "",
         show_ui: bool = False,
-        up_axis: bool = False
+        up_axis: bool = False,
+        binary: bool = False,
+        precision: int = None,
+        profile: Callable[[dict], None] = None,
+        data: str = "inline",
+        data_dir: str = "babyplots_data",
+        data_url: str = None,
+        progressive: int = None
     ):
         """
         Parameters
@@ -84,7 +195,49 @@ class Babyplot(object):
         up_axis: Sets the camera up vector;
         Either "+x", "-x", "+y", "-y", "+z", or "-z" (Default: "+y").
 
+        binary: If True, numerical coordinates and color variables are
+        converted to float32 (or int32) arrays and embedded as base64 encoded
+        binary buffers instead of JSON number lists. This considerably
+        reduces the size of the output and the time needed to create and load
+        it for large data sets.
+
+        precision: Number of significant digits to which floating point
+        coordinates and color values are rounded in the output, e.g. 4 for
+        embeddings. By default, the values are not rounded. Ignored if binary
+        is True.
+
+        profile: A function that is called with a dictionary for every timed
+        step of rendering or saving the visualization, e.g. {"step":
+        "convert", "plot": 0, "plotType": "pointCloud", "seconds": 0.2}. See
+        also the stats() method.
+
+        data: Where the notebook display takes the plot data from; Either
+        "inline" (embedded in the notebook), "sidecar" (files written to
+        data_dir, which the notebook server serves next to the notebook) or
+        "server" (served by an http server in the kernel, only reachable from
+        the same machine). With "sidecar" and "server", the notebook only
+        stores the urls of the data, which is loaded once the visualization
+        scrolls into view. Exports (e.g. save_as_html) always embed the
+        data. The server replaces the data of a visualization when it is
+        displayed again and keeps at most 2 GB of data in total, so outputs
+        of earlier displays may no longer load.
+
+        data_dir: Directory of the sidecar files, relative to the notebook.
+
+        data_url: Url under which data_dir is reachable, if it is not served
+        by the notebook server (e.g. "https://example.com/data/"). By
+        default, the url is derived from the notebook location (only the
+        classic Notebook and notebooks in the JupyterLab root directory).
+
+        progressive: If set, point clouds and shape clouds with more points
+        are displayed progressively: The points are ordered from coarse to
+        fine along an octree, a first overview of progressive points is
+        shown immediately and then refined with chunks of further points.
+
         """
+        if data not in DATA_MODES:
+            raise ValueError(
+                "data must be one of {}, not '{}'.".format(DATA_MODES, data))
         self.plots = []
         self.turntable = turntable
         self.rotation_rate = rotation_rate
@@ -97,15 +250,22 @@ class Babyplot(object):
         self.shape_legend_title = shape_legend_title
         self.show_ui = show_ui
         self.upAxis = up_axis
-        bpjs_file = os.path.join(
-            dirname,
-            'js/babyplots.js'
-        )
-        with open(bpjs_file, 'r', encoding="utf-8") as infile:
-            bpjs = infile.read()
-        bpjs = "define('Baby', [], function() {{{0}\nreturn Baby;}})".format(
-            bpjs)
-        display(Javascript(bpjs))
+        self.binary = binary
+        self.precision = precision
+        self.profile = profile
+        self.data = data
+        self.data_dir = data_dir
+        self.data_url = data_url
+        self.progressive = progressive
+        self._last_export = {}
+        init_notebook()
+
+    def __getstate__(self):
+        # the profile function is usually a closure, which can not be
+        # pickled, e.g. to export the object in another process
+        state = dict(self.__dict__)
+        state["profile"] = None
+        return state
 
     def add_plot(
             self,
@@ -113,13 +273,18 @@ class Babyplot(object):
             plot_type: str,
             color_by: str,
             color_var: Union[List[float], List[str]],
-            options: dict = {}
+            options: dict = {},
+            max_points: int = None,
+            lod: str = "voxel",
+            max_grid: Union[int, Tuple[int, int]] = None
     ):
         """Add a plot to the Babyplot object
 
         Parameters
         ---
-        coordinates: The coordinates of the data points (list or numpy ndarray).
+        coordinates: The coordinates of the data points (list or numpy ndarray);
+        For heatMap and surface plots, the grid of values (nested list, 2D numpy
+        ndarray or DataFrame).
 
         plot_tyes: Either "pointCloud", "shapeCloud", "heatMap", "surface", or
         "line".
@@ -134,31 +299,40 @@ class Babyplot(object):
         documentation (https://bp.bleb.li/documentation/python") for a complete
         list of possible options.
 
-        """
-        if isinstance(coordinates, np.ndarray):
-            coordinates = coordinates.tolist()
+        max_points: If set, point clouds and shape clouds with more points
+        are reduced to at most max_points points before they are added. The
+        color variable and the "labels", "dpInfo" and "animationTargets"
+        options are reduced accordingly. The number of dropped points per
+        category is stored in the "lod" entry of the plot.
 
-        if isinstance(color_var, np.ndarray):
-            color_var = color_var.tolist()
+        lod: Method used to reduce the number of points if max_points is set;
+        Either "voxel" (one point per cell of a regular grid), "stratified"
+        (same fraction of points from each category, requires color_by
+        "categories") or "random".
 
-        self.plots.append(
-            {
-                'coordinates': coordinates,
-                'plotType': plot_type,
-                'colorBy': color_by,
-                'colorVar': color_var,
-                'options': options
-            }
-        )
+        max_grid: If set, the grids of heatMap and surface plots with more
+        rows or columns are reduced by averaging blocks of cells; Either one
+        number for both or a pair (rows, columns). A color variable with one
+        value per cell and the "colnames" and "rownames" options are reduced
+        accordingly. The original and reduced grid shapes are stored in the
+        "lod" entry of the plot.
+
+        """
+        self._add_coordinate_plot(
+            coordinates, plot_type, color_by, color_var, options,
+            max_points, lod, max_grid)
 
     def add_plot_from_dataframe(
         self,
-        dataframe: pd.DataFrame,
+        dataframe: "pandas.DataFrame",
         plot_type: str,
         color_by: str,
         color_var: Union[List[float], List[str], str],
         coord_columns: List[str] = [],
-        options: dict = {}
+        options: dict = {},
+        max_points: int = None,
+        lod: str = "voxel",
+        max_grid: Union[int, Tuple[int, int]] = None
     ):
         """Add a plot to the Babyplot object from a pandas dataframe.
 
@@ -168,6 +342,14 @@ class Babyplot(object):
         of the color variable column. Otherwise, the color_var parameters must
         be the list of color variables (as in the add_plot method).
 
+        For heatMap and surface plots, the coordinate columns are the columns
+        of the grid, unless three coord_columns are given: these are taken as
+        the x, y and z values of a long-format dataframe with one row per
+        cell, which is pivoted into a grid of z values. Its rows are the
+        distinct x values and its columns the distinct y values, which become
+        the "colnames" and "rownames" options (unless these are given), and a
+        numerical color variable is pivoted along with z.
+
         Parameters
         ---
         dataframe: The pandas dataframe from which to take the coordinates for
@@ -192,25 +374,551 @@ class Babyplot(object):
         documentation (https://bp.bleb.li/documentation/python") for a complete
         list of possible options.
 
+        max_points: If set, point clouds and shape clouds with more points
+        are reduced to at most max_points points before they are added. The
+        color variable and the "labels", "dpInfo" and "animationTargets"
+        options are reduced accordingly. The number of dropped points per
+        category is stored in the "lod" entry of the plot.
+
+        lod: Method used to reduce the number of points if max_points is set;
+        Either "voxel" (one point per cell of a regular grid), "stratified"
+        (same fraction of points from each category, requires color_by
+        "categories") or "random".
+
+        max_grid: If set, the grids of heatMap and surface plots with more
+        rows or columns are reduced by averaging blocks of cells; Either one
+        number for both or a pair (rows, columns). A color variable with one
+        value per cell and the "colnames" and "rownames" options are reduced
+        accordingly. The original and reduced grid shapes are stored in the
+        "lod" entry of the plot.
+
         """
-        dataframe = dataframe.copy()
+        import pandas as pd
+
+        # columns are selected without copying the dataframe; the values are
+        # only converted when the plot is rendered
+        columns = list(coord_columns)
         if isinstance(color_var, str):
             if color_var not in dataframe.columns:
                 raise KeyError(
                     "color_var '{}' not in dataframe columns.".format(color_var))
-            color_var = dataframe.pop(color_var).values.tolist()
-        if coord_columns:
-            dataframe = dataframe[coord_columns]
-        self.plots.append(
-            {
-                'coordinates': dataframe.values.tolist(),
-                'plotType': plot_type,
-                'colorBy': color_by,
-                'colorVar': color_var,
-                'options': options
+            column = dataframe[color_var]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                color_var = column.array
+            else:
+                color_var = column.to_numpy()
+            if not columns:
+                columns = [c for c in dataframe.columns if c != column.name]
+        lod_info = None
+        if plot_type in GRID_PLOT_TYPES and len(coord_columns) == 3:
+            x, y, z = (dataframe[c].to_numpy() for c in coord_columns)
+            coordinates, color_var, options, lod_info = pivot_plot(
+                x, y, z, color_var, options, max_grid)
+        elif columns:
+            coordinates = dataframe[columns].to_numpy()
+        else:
+            coordinates = dataframe.to_numpy()
+        coordinates = self._stored_coordinates(coordinates)
+        self._add_coordinate_plot(
+            coordinates, plot_type, color_by, color_var, options,
+            max_points, lod, max_grid, lod_info)
+
+    def add_animated_plot(
+        self,
+        frames: np.ndarray,
+        color_by: str,
+        color_var: Union[List[float], List[str]],
+        options: dict = {},
+        frame_duration: int = 1000,
+        delay: int = 0,
+        loop: bool = True,
+        bits: int = None,
+        skip_static: bool = False
+    ):
+        """Add a point cloud that is animated through a sequence of
+        keyframes.
+
+        The points are shown at their positions in the first keyframe and
+        move linearly from each keyframe to the next. The keyframes are
+        stored as binary changes of the positions from the first keyframe
+        (see keyframes.py), which keeps the visualization small compared to
+        the "animationTargets" option.
+
+        Parameters
+        ---
+        frames: The positions of the data points in each keyframe; Array of
+        shape (keyframes, points, 3).
+
+        color_by: Either "categories", "values", or "direct".
+
+        color_var: The variable to use for coloring the data points, as in
+        add_plot().
+
+        options: A dictionary of plot options, as in add_plot(). The
+        "hasAnimation", "animationTargets" and "animationLoop" options of
+        the babyplots library are not used.
+
+        frame_duration: Milliseconds the points take to move from one
+        keyframe to the next.
+
+        delay: Milliseconds before the animation starts.
+
+        loop: If True, the animation is played back and forth repeatedly.
+        Otherwise it stops at the last keyframe.
+
+        bits: If set, the position changes are quantized to 8 or 16 bit
+        integers instead of being stored as float32 values.
+
+        skip_static: If True, only the positions of the points that move in
+        any keyframe are stored for the keyframes.
+
+        """
+        coordinates, animation = pack_keyframes(frames, bits, skip_static)
+        animation.update({
+            "frameDuration": frame_duration,
+            "delay": delay,
+            "loop": loop
+        })
+        options = {
+            key: value for key, value in options.items()
+            if key not in ("hasAnimation", "animationTargets", "animationLoop")
+        }
+        self._add_coordinate_plot(
+            coordinates, "pointCloud", color_by, color_var, options)
+        self.plots[-1]['animation'] = animation
+
+    def _stored_coordinates(self, coordinates: np.ndarray) -> np.ndarray:
+        """Returns the coordinates of an existing plot that are equal to
+        coordinates, so that the same embedding added several times (e.g.
+        colored by different columns) is only stored once."""
+        for plot in self.plots:
+            stored = plot.get("coordinates")
+            if (
+                isinstance(stored, np.ndarray)
+                and stored.dtype == coordinates.dtype
+                and stored.shape == coordinates.shape
+                # cheap check of the first points before comparing all
+                and np.array_equal(stored[:16], coordinates[:16])
+                and np.array_equal(stored, coordinates)
+            ):
+                return stored
+        return coordinates
+
+    def _add_coordinate_plot(
+        self,
+        coordinates,
+        plot_type: str,
+        color_by: str,
+        color_var,
+        options: dict,
+        max_points: int = None,
+        lod: str = "voxel",
+        max_grid: Union[int, Tuple[int, int]] = None,
+        lod_info: dict = None
+    ):
+        """Stores a plot defined by coordinates and a color variable.
+
+        lod_info describes a reduction that was already applied, e.g. when
+        pivoting a long-format grid (see grid.pivot_plot).
+
+        """
+        if plot_type in GRID_PLOT_TYPES and (
+            max_grid is not None or not isinstance(coordinates, list)
+        ):
+            coordinates, color_var, options, grid_info = self._grid_plot(
+                coordinates, color_by, color_var, options, max_grid)
+            if grid_info is not None:
+                lod_info = grid_info
+        elif (
+            max_points is not None
+            and plot_type in ("pointCloud", "shapeCloud")
+            and len(coordinates) > max_points
+        ):
+            coordinates, color_var, options, lod_info = self._reduce_points(
+                coordinates, color_by, color_var, options, max_points, lod)
+
+        plot = {
+            'coordinates': coordinates,
+            'plotType': plot_type,
+            'colorBy': color_by,
+            'colorVar': color_var,
+            'options': options
+        }
+        if lod_info is not None:
+            plot['lod'] = lod_info
+        self.plots.append(plot)
+
+    @staticmethod
+    def _reduce_points(
+        coordinates,
+        color_by: str,
+        color_var,
+        options: dict,
+        max_points: int,
+        lod: str
+    ):
+        """Reduces a point cloud to at most max_points points.
+
+        Returns the reduced coordinates, color variable and options, and a
+        dictionary describing the reduction.
+
+        """
+        coordinates = np.asarray(coordinates)
+        n = len(coordinates)
+        categories = None
+        if color_by == "categories" and len(color_var) == n:
+            categories = color_var
+        keep = downsample(coordinates, max_points, lod, categories)
+        coordinates, color_var, options = Babyplot._take_points(
+            coordinates, color_var, options, keep)
+        lod_info = {
+            'method': lod,
+            'total': n,
+            'kept': len(keep),
+            'dropped': (
+                dropped_per_category(categories, keep)
+                if categories is not None else {}
+            )
+        }
+        return coordinates, color_var, options, lod_info
+
+    @staticmethod
+    def _grid_plot(
+        coordinates,
+        color_by: str,
+        color_var,
+        options: dict,
+        max_grid: Union[int, Tuple[int, int]] = None
+    ):
+        """Converts the grid of a heatMap or surface plot to a 2D array and
+        reduces it to at most max_grid rows and columns.
+
+        A color variable given as a grid is flattened in the order of the
+        cells expected by the babyplots library (row by row).
+
+        Returns the grid, color variable and options, and a dictionary
+        describing the reduction (None if the grid was not reduced).
+
+        """
+        grid = as_grid(coordinates)
+        shape = grid.shape
+        cell_colors = color_var is not None and (
+            np.ndim(color_var) == 2 or len(color_var) == grid.size)
+        lod_info = None
+        rows, cols = grid_size(max_grid) if max_grid is not None else shape
+        if shape[0] > rows or shape[1] > cols:
+            row_starts = block_starts(shape[0], rows)
+            col_starts = block_starts(shape[1], cols)
+            grid = block_means(grid, row_starts, col_starts)
+            if cell_colors:
+                colors = np.asarray(color_var).reshape(shape)
+                if color_by == "values":
+                    color_var = block_means(colors, row_starts, col_starts)
+                else:
+                    color_var = block_centers(colors, row_starts, col_starts)
+            options = dict(options)
+            for key, starts, n in (
+                ("colnames", row_starts, shape[0]),
+                ("rownames", col_starts, shape[1])
+            ):
+                if options.get(key) is not None and len(options[key]) == n:
+                    options[key] = block_labels(list(options[key]), starts, n)
+            lod_info = {
+                'method': "grid",
+                'total': list(shape),
+                'kept': list(grid.shape)
             }
+        if cell_colors and np.ndim(color_var) == 2:
+            color_var = np.asarray(color_var).ravel()
+        return grid, color_var, options, lod_info
+
+    @staticmethod
+    def _take_points(coordinates: np.ndarray, color_var, options: dict,
+                     keep: np.ndarray):
+        """Selects (or reorders) the data points of a plot by index.
+
+        The color variable and the per data point options ("labels",
+        "dpInfo" and "animationTargets") are selected accordingly.
+
+        """
+        n = len(coordinates)
+
+        def take(values):
+            if values is None or len(values) != n:
+                return values
+            if hasattr(values, "iloc"):
+                # pandas Series are selected by position, not by label
+                values = (
+                    values.array if str(values.dtype) == "category"
+                    else values.to_numpy())
+            if not isinstance(values, (list, tuple)):
+                # numpy arrays and pandas arrays (e.g. Categoricals)
+                return values[keep]
+            picked = itemgetter(*keep.tolist())(values)
+            return list(picked) if len(keep) > 1 else [picked]
+
+        options = dict(options)
+        for key in ("labels", "dpInfo"):
+            if key in options:
+                options[key] = take(options[key])
+        if options.get("animationTargets") is not None:
+            # the start positions of the points, one per data point
+            options["animationTargets"] = np.asarray(
+                options["animationTargets"])[keep]
+        return coordinates[keep], take(color_var), options
+
+    def _convert_values(self, values, encode=None):
+        """Converts coordinates or color variables to their wire format.
+
+        If binary encoding is enabled (or an encode function for typed
+        arrays is given), numerical values are converted to binary encoded
+        typed arrays. Otherwise numpy arrays are kept, as they are written
+        directly by the json backend, and other arrays are converted to
+        lists.
+
+        """
+        if self.binary or encode is not None:
+            typed = as_typed_array(values)
+            if typed is not None:
+                return (encode or encode_array)(typed)
+        elif self.precision is not None:
+            array = np.asarray(values)
+            if array.dtype.kind == "f":
+                return round_significant(array, self.precision)
+        if isinstance(values, np.ndarray):
+            return values
+        if hasattr(values, "tolist"):
+            # pandas Series and Categoricals
+            return values.tolist()
+        return values
+
+    def _wire_plot(self, plot: dict, categories: bool = True,
+                   encode=None) -> dict:
+        """Converts a stored plot to the format sent to the browser.
+
+        Plots are stored with the arrays they were created from, which are
+        only converted here, when the visualization is rendered.
+
+        Parameters
+        ---
+        plot: A plot from self.plots.
+
+        categories: If True, categorical color variables are dictionary
+        encoded as integer codes and a table of levels (see
+        encoding.encode_categories). If False, as for the babyplots json
+        format, quantized values and run-length encoded indices of image
+        stacks are expanded as well.
+
+        encode: Function that encodes typed arrays, used instead of
+        encoding.encode_array. If given, numerical values are binary encoded
+        even if binary encoding is disabled.
+
+        """
+        wire = dict(plot)
+        if "coordinates" in plot:
+            wire["coordinates"] = self._convert_values(
+                plot["coordinates"], encode)
+        if "colorVar" in plot:
+            if plot["colorBy"] == "categories" and (categories or self.binary):
+                wire["colorVar"] = encode_buffers(encode_categories(
+                    plot["colorVar"], plot["options"].get("sortedCategories")),
+                    encode or encode_array)
+            else:
+                wire["colorVar"] = self._convert_values(
+                    plot["colorVar"], encode)
+        for key in ("stream", "animation"):
+            if key in plot:
+                wire[key] = encode_buffers(plot[key], encode or encode_array)
+        for key in ("vals", "indices"):
+            if key not in plot:
+                continue
+            if isinstance(plot[key], dict) and categories:
+                wire[key] = encode_buffers(plot[key], encode or encode_array)
+            elif isinstance(plot[key], dict):
+                decode = (
+                    dequantize if "__quantized__" in plot[key] else decode_runs)
+                wire[key] = self._convert_values(decode(plot[key]), encode)
+            else:
+                wire[key] = self._convert_values(plot[key], encode)
+        return wire
+
+    def _is_progressive(self, plot: dict) -> bool:
+        return bool(
+            self.progressive
+            and plot["plotType"] in ("pointCloud", "shapeCloud")
+            and "animation" not in plot
+            and len(plot["coordinates"]) > self.progressive
         )
 
+    def _render_plot(self, plot: dict, encode=None,
+                     shared: SharedArrays = None) -> dict:
+        """Converts a plot to the format sent to the browser for display.
+
+        Large point clouds are converted progressively, if enabled.
+
+        Parameters
+        ---
+        plot: A plot from self.plots.
+
+        encode: Function that encodes typed arrays (see _wire_plot()).
+
+        shared: The arrays shared between the rendered plots. Shared arrays
+        are only converted for the first plot using them and replaced by
+        references (see shared.py).
+
+        """
+        if self._is_progressive(plot):
+            return self._wire_progressive(plot, encode)
+        if shared is None:
+            return self._wire_plot(plot, encode=encode)
+        digests = shared.digests(plot)
+        # arrays that were already sent are not converted again
+        wire = self._wire_plot({
+            key: value for key, value in plot.items()
+            if digests.get(key) not in shared.sent
+        }, encode=encode)
+        for key, digest in digests.items():
+            if digest not in shared.sent:
+                wire.setdefault("shared", {})[digest] = wire[key]
+                shared.sent.add(digest)
+            wire[key] = {"__shared__": digest}
+        return wire
+
+    def _shared_arrays(self) -> SharedArrays:
+        return SharedArrays([
+            plot for plot in self.plots if not self._is_progressive(plot)])
+
+    def _wire_progressive(self, plot: dict, encode=None) -> dict:
+        """Converts a point cloud to chunks of points from coarse to fine.
+
+        The first chunk is stored as the coordinates and color variable of
+        the plot, the other chunks as its "refinements", which are added one
+        after the other by the page (see bpRefine in helpers.js).
+
+        """
+        coordinates = np.asarray(plot["coordinates"])
+        n = len(coordinates)
+        color_var = plot["colorVar"]
+        has_colors = color_var is not None and len(color_var) == n
+        # the overview should show every category and the full value range
+        priority = None
+        if has_colors and plot["colorBy"] == "categories":
+            codes = encode_categories(color_var)["__categories__"]
+            priority = np.unique(codes, return_index=True)[1]
+        elif has_colors and plot["colorBy"] == "values":
+            values = np.asarray(color_var, dtype=np.float64)
+            if np.isfinite(values).any():
+                priority = [np.nanargmin(values), np.nanargmax(values)]
+        order = progressive_order(coordinates, priority)
+        coordinates, color_var, options = self._take_points(
+            coordinates, color_var, plot["options"], order)
+
+        chunks = []
+        start = 0
+        for size in progressive_chunks(n, self.progressive):
+            chunk = {
+                "coordinates": coordinates[start:start + size],
+                "colorBy": plot["colorBy"],
+                "options": options
+            }
+            if has_colors:
+                chunk["colorVar"] = color_var[start:start + size]
+            chunk = self._wire_plot(chunk, encode=encode)
+            chunks.append({
+                key: chunk[key]
+                for key in ("coordinates", "colorVar") if key in chunk
+            })
+            start += size
+        wire = dict(plot, options=options, total=n)
+        wire.update(chunks[0])
+        if not has_colors:
+            wire["colorVar"] = self._convert_values(color_var, encode)
+        wire["refinements"] = chunks[1:]
+        return wire
+
+    def _wire_plots(self):
+        """Yields the plots in their wire format one at a time."""
+        start = perf_counter()
+        shared = self._shared_arrays()
+        self._record("hash", perf_counter() - start)
+        for i, plot in enumerate(self.plots):
+            start = perf_counter()
+            wire = self._render_plot(plot, shared=shared)
+            self._record(
+                "convert", perf_counter() - start,
+                plot=i, plotType=plot["plotType"])
+            yield wire
+
+    def _record(self, step: str, seconds: float, **info):
+        """Passes the timing of a step to the profile function, if set."""
+        if self.profile is not None:
+            event = {"step": step, "seconds": seconds}
+            event.update(info)
+            self.profile(event)
+
+    def _export_finished(self, target: str, start: float,
+                         write_seconds: float, characters: int):
+        """Records the timing of a complete render or save operation."""
+        total = perf_counter() - start
+        self._last_export = {
+            "target": target,
+            "render_seconds": total - write_seconds,
+            "write_seconds": write_seconds,
+            "characters": characters
+        }
+        self._record("render", total - write_seconds,
+                     target=target, characters=characters)
+        if write_seconds:
+            self._record("write", write_seconds, target=target)
+
+    def stats(self) -> dict:
+        """Returns the size and conversion time of each plot.
+
+        Every plot is converted and serialized once to measure it. The
+        timings of the last call of _repr_html_, as_html, as_json,
+        save_as_html or save_as_json are included as "last_export".
+
+        Returns
+        ---
+        A dictionary with the keys "library_bytes" (size of the embedded
+        babyplots.js), "plots" (a list with the plot type, number of points
+        or voxels, serialized bytes and the seconds spent converting,
+        building the json dictionary and serializing each plot),
+        "total_bytes" and "last_export".
+
+        """
+        plots = []
+        for i, plot in enumerate(self.plots):
+            start = perf_counter()
+            wire = self._wire_plot(plot)
+            convert_seconds = perf_counter() - start
+            start = perf_counter()
+            self._plot_to_dict(wire)
+            to_dict_seconds = perf_counter() - start
+            start = perf_counter()
+            serialized = dumps(wire)
+            serialize_seconds = perf_counter() - start
+            entry = {
+                "plot": i,
+                "plotType": plot["plotType"],
+                "count": _plot_count(plot),
+                "serialized_bytes": len(serialized.encode("utf-8")),
+                "convert_seconds": convert_seconds,
+                "to_dict_seconds": to_dict_seconds,
+                "serialize_seconds": serialize_seconds
+            }
+            if "lod" in plot:
+                entry["lod"] = plot["lod"]
+            plots.append(entry)
+        library_bytes = len(_load_bpjs().encode("utf-8"))
+        return {
+            "library_bytes": library_bytes,
+            "plots": plots,
+            "total_bytes": library_bytes + sum(
+                p["serialized_bytes"] for p in plots),
+            "last_export": dict(self._last_export)
+        }
+
     def add_mesh_stream(
         self,
         root_url: str,
@@ -240,29 +948,87 @@ class Babyplot(object):
             }
         )
 
+    def add_mesh_frames(
+        self,
+        frame_paths: List[str],
+        frame_delay: int = 200,
+        options: dict = {},
+        bits: int = 16,
+        bundle_path: str = None,
+        bundle_url: str = None
+    ):
+        """Add an animated mesh from a sequence of local glTF files.
+
+        Unlike add_mesh_stream(), the frames are read here and packed into
+        the visualization, so that it can be played back without a server.
+        All frames must share the same triangles; only the vertex positions
+        may change. The first frame is stored as a mesh and every following
+        frame as quantized changes of the vertex positions (see
+        meshstream.py).
+
+        Parameters
+        ---
+        frame_paths: File paths of the frames (.gltf or .glb), in order.
+
+        frame_delay: Milliseconds between two frames.
+
+        options: A dictionary of visualization options, as for
+        add_mesh_object().
+
+        bits: Bit depth of the quantized vertex position changes; Either 8
+        or 16.
+
+        bundle_path: If set, the packed frames are written to this file
+        instead of being embedded, and loaded by the page from bundle_url.
+        This requires the visualization to be served over http.
+
+        bundle_url: Url of the bundle file, relative to the html file or
+        notebook. Defaults to bundle_path.
+
+        """
+        name = "bpframes_" + uuid4().hex[:12]
+        packed = pack_frames(frame_paths, name, bits)
+        plot = {
+            'plotType': "meshFrames",
+            'meshString': glb_string(packed["glb"]),
+            'meshName': name,
+            'frameDelay': frame_delay,
+            'options': options
+        }
+        if bundle_path is None:
+            plot['stream'] = packed["stream"]
+        else:
+            buffers = []
+            data = encode_buffers(packed["stream"], buffer_encoder(buffers))
+            with open(bundle_path, "wb") as outfile:
+                outfile.write(pack_plot(data, buffers))
+            plot['streamUrl'] = bundle_url or bundle_path.replace(os.sep, "/")
+        self.plots.append(plot)
+
     def add_mesh_object(
         self,
         filepath: str,
-        options: dict = {}
+        options: dict = {},
+        target_triangles: int = None
     ):
         """Add a 3D model or scene of 3D models from a glTF file to the Babyplots object.
 
         Parameters
         ---
-        filepath: File path of the glTF file.
+        filepath: File path of the glTF (.gltf) or binary glTF (.glb) file.
 
         options: A dictionary of visualization options. Please refer to the
         documentation (https://bp.bleb.li/documentation/python") for a complete
         list of possible options.
-        """
 
-        with open(filepath, "r") as infile:
-            meshString = infile.read()
+        target_triangles: If set, the meshes of the model are simplified to
+        about this number of triangles in total (see gltf.simplify).
+        """
 
         self.plots.append(
             {
                 'plotType': "meshObject",
-                'meshString': meshString,
+                'meshString': mesh_string(filepath, target_triangles),
                 'options': options
             }
         )
@@ -272,7 +1038,9 @@ class Babyplot(object):
         vals: List[float],
         indices: List[int],
         attributes: dict,
-        options: dict = {}
+        options: dict = {},
+        compact: bool = False,
+        bits: int = 8
     ):
         """Add an image stack visualization to the Babyplot object.
 
@@ -294,7 +1062,17 @@ class Babyplot(object):
         documentation (https://bp.bleb.li/documentation/python") for a complete
         list of possible options.
 
+        compact: If True, the intensities are quantized to bits bit integers
+        over their range and the (sorted) indices are stored as runs of
+        consecutive pixels. Both are embedded as binary buffers.
+
+        bits: Bit depth of the quantized intensities if compact is True;
+        Either 8 or 16.
+
         """
+        if compact:
+            vals = quantize(vals, bits)
+            indices = run_length(indices)
         self.plots.append(
             {
                 'plotType': "imageStack",
@@ -310,7 +1088,8 @@ class Babyplot(object):
         image_path: str,
         threshold: float = 0.1,
         channel_thresholds: List[float] = None,
-        options: dict = {}
+        options: dict = {},
+        compact: bool = False
     ):
         """Add a 3d image stack from a tiff file to the Babyplot object.
 
@@ -326,50 +1105,133 @@ class Babyplot(object):
         documentation (https://bp.bleb.li/documentation/python") for a complete
         list of possible options.
 
+        compact: If True, the intensities are stored at the bit depth of the
+        image (8 or 16 bit) and the indices as runs of consecutive pixels,
+        both embedded as binary buffers. This is lossless for 8 and 16 bit
+        unsigned images.
+
         """
-        im = img_as_float(io.imread(image_path))  # im shape: z, x, y, c
-        # if image has no color channels, adjust dimensions
-        if len(im.shape) == 3:
-            im = np.expand_dims(im, axis=-1)
-        # set shape attribute
+        vals, idcs, dim, dtype = read_thresholded_stack(
+            image_path, threshold, channel_thresholds)
         attributes = {
-            "dim": [im.shape[1], im.shape[2], im.shape[3], im.shape[0]]
+            "dim": dim
         }
-        # apply channel-wise thresholds if given.
-        if channel_thresholds is not None:
-            for i, thres in enumerate(channel_thresholds):
-                mask = im[:, :, :, i] < thres
-                im[:, :, :, i][mask] = 0
-        # reorder dimensions to that flatten gives the same order as R equivalent
-        im = np.transpose(im, (0, 3, 2, 1))  # im shape becomes z, c, y, x
-        # flatten
-        n_vals = reduce(lambda x, y: x*y, im.shape)
-        im = np.reshape(im, n_vals)
-        # find indices of values larger than threshold
-        # single threshold is ignored when per channel thresholds are given
-        if channel_thresholds is None:
-            idcs = np.argwhere(im > threshold).squeeze()
-        else:
-            idcs = np.argwhere(im > 0).squeeze()
-        # only keep non-zero values
-        im = im[idcs].tolist()
-        idcs = idcs.tolist()
 
-        self.add_img_stack(im, idcs, attributes, options)
+        if compact:
+            bits = 8 if dtype.itemsize == 1 else 16
+            if dtype.kind == "u" and dtype.itemsize <= 2:
+                # img_as_float maps unsigned images to [0, 1]
+                vals = quantize(vals, bits, 0.0, 1 / (2 ** bits - 1))
+            else:
+                vals = quantize(vals, bits)
+            idcs = run_length(idcs)
+
+        self.add_img_stack(vals, idcs, attributes, options)
 
     def _repr_html_(self):
         """Displays the babyplots visualization in a Jupyter Notebook."""
+        start = perf_counter()
         display_id = str(uuid4()).replace('-', '_')
-
-        html = JENV.get_template('plot.html')
-        output = html.render(baby=self, display_id=display_id)
+        output = self._notebook_html(display_id)
+        self._export_finished("_repr_html_", start, 0, len(output))
         return output
 
+    def _notebook_html(self, display_id: str, live: bool = False) -> str:
+        html = _template('plot.html')
+        if self.data == "inline":
+            return html.render(
+                baby=self,
+                plots=self._wire_plots(),
+                display_id=display_id,
+                live=live
+            )
+        return html.render(
+            baby=self,
+            sources=self._data_sources(),
+            display_id=display_id,
+            live=live
+        )
+
+    def _data_sources(self) -> List[dict]:
+        """Writes or serves the data of each plot out-of-band.
+
+        Returns
+        ---
+        The url of each plot and whether it is relative to the notebook.
+
+        """
+        sources = []
+        shared = self._shared_arrays()
+        if self.data == "server":
+            # the data of earlier renderings of this figure is replaced
+            data_server().release(id(self))
+        for i, plot in enumerate(self.plots):
+            start = perf_counter()
+            buffers = []
+            wire = self._render_plot(
+                plot, encode=buffer_encoder(buffers), shared=shared)
+            packed = pack_plot(wire, buffers)
+            self._record(
+                "convert", perf_counter() - start,
+                plot=i, plotType=plot["plotType"])
+            if self.data == "server":
+                source = {
+                    "url": data_server().add(packed, owner=id(self)),
+                    "relative": False
+                }
+            else:
+                path = write_sidecar(packed, self.data_dir)
+                name = os.path.basename(path)
+                if self.data_url is not None:
+                    source = {
+                        "url": self.data_url.rstrip("/") + "/" + name,
+                        "relative": False
+                    }
+                else:
+                    directory = os.path.normpath(self.data_dir)
+                    source = {
+                        "url": directory.replace(os.sep, "/") + "/" + name,
+                        "relative": True
+                    }
+            sources.append(source)
+        return sources
+
+    def live(
+        self,
+        max_rate: float = 10,
+        comm_factory: Callable[[str, dict], object] = None
+    ) -> LiveFigure:
+        """Displays the visualization in a Jupyter Notebook and returns a
+        LiveFigure, through which the displayed plots can be updated.
+
+        Appended points, changed colors and replaced plots are sent to the
+        displayed visualization over a Jupyter comm as binary buffers,
+        without rendering the whole visualization again. Only supported in
+        the classic Jupyter Notebook.
+
+        Parameters
+        ---
+        max_rate: Maximum number of update messages per second. Updates made
+        in between are combined into one message.
+
+        comm_factory: Function that opens the comm, given a target name and
+        the data of the opening message. By default, an ipykernel comm is
+        opened.
+        """
+        from IPython.display import HTML, display
+
+        figure = LiveFigure(self, max_rate, comm_factory)
+        display(HTML(self._notebook_html(figure.display_id, live=True)))
+        return figure
+
     def as_html(
         self,
         standalone: bool = True,
         fullscreen: bool = False,
-        title: str = "Babyplot"
+        title: str = "Babyplot",
+        compression: str = None,
+        workers: int = 1,
+        library_url: str = None
     ) -> str:
         """Returns the babyplots visualization as an html string.
 
@@ -383,48 +1245,154 @@ class Babyplot(object):
 
         title: Title of the html page.
 
+        compression: Either None, "gzip" or "deflate". If set, the babyplots
+        library and the data of each plot are compressed and embedded as
+        base64 strings, which are decompressed in the browser. This makes
+        the html considerably smaller, but requires a browser supporting the
+        DecompressionStream API.
+
+        workers: Number of threads used to compress the plots in parallel if
+        compression is set.
+
+        library_url: If set, the babyplots library is loaded from this url
+        (e.g. "babyplots.js", relative to the html file) instead of being
+        embedded in the html document.
+
+        """
+        start = perf_counter()
+        output = "".join(self._iter_html(
+            standalone, fullscreen, title, compression, workers,
+            library_url))
+        self._export_finished("as_html", start, 0, len(output))
+        return output
+
+    def _iter_html(
+        self,
+        standalone: bool = True,
+        fullscreen: bool = False,
+        title: str = "Babyplot",
+        compression: str = None,
+        workers: int = 1,
+        library_url: str = None
+    ):
+        """Renders the babyplots visualization as html piece by piece.
+
+        Returns a generator of strings, so that the complete document never
+        has to be held in memory. See as_html() for the parameters.
+
         """
         display_id = str(uuid4()).replace('-', '_')
-        bpjs_file = os.path.join(
-            dirname,
-            'js/babyplots.js'
-        )
-        with open(bpjs_file, 'r', encoding="utf-8") as infile:
-            bpjs = infile.read()
-        html = JENV.get_template('save_plot.html')
-        output = html.render(
+        bpjs = None
+        if compression is None:
+            if standalone and library_url is None:
+                bpjs = _load_bpjs()
+            payloads = None
+        elif compression in COMPRESSION_FORMATS:
+            if standalone and library_url is None:
+                bpjs = _load_bpjs_compressed(compression)
+            payloads = self._compressed_payloads(compression, workers)
+        else:
+            raise ValueError(
+                "compression must be None or one of {}, not '{}'.".format(
+                    COMPRESSION_FORMATS, compression))
+        html = _template('save_plot.html')
+        return html.generate(
             baby=self,
+            plots=self._wire_plots(),
             standalone=standalone,
             display_id=display_id,
             bpjs=bpjs,
             vis_name=title,
-            fullscreen=fullscreen
+            fullscreen=fullscreen,
+            compression=compression,
+            payloads=payloads,
+            library_url=library_url
         )
-        return output
+
+    def _compressed_payloads(self, compression: str, workers: int = 1):
+        """Yields the json data of each plot, compressed and base64 encoded.
+
+        If workers is larger than 1, the plots are compressed in parallel
+        threads, while still being yielded in order. At most workers plots
+        are converted ahead of the one being yielded, so that memory usage
+        stays bounded by a few plots.
+
+        """
+        def payload(plot):
+            data = dumps(plot).encode("utf-8")
+            return compress(data, compression)
+
+        if workers > 1 and len(self.plots) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for plot in self._wire_plots():
+                    if len(pending) >= workers:
+                        yield pending.popleft().result()
+                    pending.append(executor.submit(payload, plot))
+                    del plot
+                while pending:
+                    yield pending.popleft().result()
+        else:
+            for plot in self._wire_plots():
+                yield payload(plot)
 
     def save_as_html(
         self,
-        path: str,
+        path: Union[str, IO[str]],
         fullscreen: bool = False,
-        title: str = "Babyplot"
+        title: str = "Babyplot",
+        compression: str = None,
+        workers: int = 1,
+        library_url: str = None
     ):
         """Save the babyplots visualization as an html file.
 
+        The html document is streamed to the file plot by plot, so memory
+        usage is bounded by the largest plot instead of the whole document.
+
         Parameters
         ---
-        path: Filepath for the output.
+        path: Filepath for the output or a writable text file object.
 
         fullscreen: If set to True, the visualization will fill the viewport,
         if not, it will conform to the dimensions set in the Babyplot object.
 
         title: Title of the html page.
 
+        compression: Either None, "gzip" or "deflate". Compresses the
+        embedded library and plot data (see as_html()).
+
+        workers: Number of threads used to compress the plots in parallel if
+        compression is set.
+
+        library_url: If set, the babyplots library is loaded from this url
+        (e.g. "babyplots.js", relative to the html file) instead of being
+        embedded in the html file.
+
         """
-        with open(path, "w", encoding="utf-8") as outfile:
-            outfile.write(self.as_html(True, fullscreen, title))
+        start = perf_counter()
+        write_seconds = 0
+        characters = 0
+        with _open_output(path) as outfile:
+            for chunk in self._iter_html(
+                    True, fullscreen, title, compression, workers,
+                    library_url):
+                write_start = perf_counter()
+                outfile.write(chunk)
+                write_seconds += perf_counter() - write_start
+                characters += len(chunk)
+        self._export_finished("save_as_html", start, write_seconds, characters)
 
     def _to_dict(self):
-        d = {
+        d = self._scene_dict()
+        d["plots"] = [
+            self._plot_to_dict(self._wire_plot(plot, categories=False))
+            for plot in self.plots
+        ]
+        return d
+
+    def _scene_dict(self):
+        return {
             "turntable": self.turntable,
             "rotationRate": self.rotation_rate,
             "backgroundColor": self.background_color,
@@ -432,145 +1400,254 @@ class Babyplot(object):
             "yScale": self.y_scale,
             "zScale": self.z_scale,
             "shapeLegendTitle": self.shape_legend_title,
-            "upAxis": self.upAxis,
-            "plots": []
+            "upAxis": self.upAxis
         }
 
-        for plot in self.plots:
-            if plot["plotType"] == "imageStack":
-                d["plots"].append({
-                    "plotType": "imageStack",
-                    "values": plot["values"],
-                    "indices": plot["indices"],
-                    "attributes": ["attributes"],
-                    "size": plot["options"].get("size", 1),
-                    "colorScale": plot["options"].get("colorScale", None),
-                    "showLegend": plot["options"].get("showLegend", False),
-                    "fontSize": plot["options"].get("fontSize", 11),
-                    "fontColor": plot["options"].get("fontColor", "black"),
-                    "legendTitle": plot["options"].get(
-                        "legendTitle", None),
-                    "legendTitleFontSize": plot["options"].get(
-                        "legendTitleFontSize", 16),
-                    "legendTitleFontColor": plot["options"].get(
-                        "legendTitleFontColor", "black"),
-                    "legendPosition": plot["options"].get(
-                        "legendPosition", None),
-                    "showAxes": plot["options"].get(
-                        "showAxes", [False, False, False]),
-                    "axisLabels": plot["options"].get(
-                        "axisLabels", ["X", "Y", "Z"]),
-                    "axisColors": plot["options"].get(
-                        "axisColors", ["#666666", "#666666", "#666666"]),
-                    "tickBreaks": plot["options"].get(
-                        "tickBreaks", [2, 2, 2]),
-                    "showTickLines": plot["options"].get(
-                        "showTickLines",
-                        [[False, False], [False, False], [False, False]]),
-                    "tickLineColors": plot["options"].get(
-                        "tickLineColors",
-                        [
-                            ["#aaaaaa", "#aaaaaa"],
-                            ["#aaaaaa", "#aaaaaa"],
-                            ["#aaaaaa", "#aaaaaa"]
-                        ]),
-                    "intensityMode": plot["options"].get(
-                        "intensityMode", "alpha"),
-                    "channelColors": plot["options"].get(
-                        "channelColors",
-                        ["#ff0000", "#00ff00", "#0000ff"]),
-                    "channelOpacities": [1, 1, 1]
-                })
-            elif plot["plotType"] == "meshStream":
-                d["plots"].append({
-                    "plotType": "meshStream",
-                    "rootUrl": plot["rootUrl"],
-                    "filePrefix": plot["filePrefix"],
-                    "fileSuffix": plot["fileSuffix"],
-                    "fileIteratorStart": plot["fileIteratorStart"],
-                    "fileIteratorEnd": plot["fileIteratorEnd"],
-                    "frameDelay": plot["frameDelay"],
-                    "meshRotation": plot["options"].get("meshRotation", [0, 0, 0]),
-                    "meshOffset": plot["options"].get("meshOffset", [0, 0, 0]),
-                    "clearCoat": plot["options"].get("clearCoat", False),
-                    "clearCoatIntensity": plot["options"].get("clearCoatIntensity", 1)
-                })
-            elif plot["plotType"] == "meshObject":
-                d["plots"].append({
-                    "plotType": "meshObject",
-                    "meshString": plot["meshString"],
-                    "meshScaling": plot["options"].get("meshScaling", [1, 1, 1]),
-                    "meshRotation": plot["options"].get("meshRotation", [1, 1, 1]),
-                    "meshOffset": plot["options"].get("meshOffset", [1, 1, 1]),
-                    "showLegend": plot["options"].get("showLegend", False),
-                    "fontSize": plot["options"].get("fontSize", 11),
-                    "fontColor": plot["options"].get("fontColor", "black"),
-                    "legendTitle": plot["options"].get("legendTitle", None),
-                    "legendTitleFontSize": plot["options"].get("legendTitleFontSize", 16),
-                    "legendTitleFontColor": plot["options"].get("legendTitleFontColor", "black"),
-                    "legendPosition": plot["options"].get("legendPosition", None),
-                    "legendShowShape": plot["options"].get("legendShowShape", False),
-                    "showAxes": plot["options"].get("showAxes", [False, False, False]),
-                    "axisLabels": plot["options"].get("axisLabels", ["X", "Y", "Z"]),
-                    "axisColors": plot["options"].get("axisColors", ["#666666", "#666666", "#666666"]),
-                    "tickBreaks": plot["options"].get("tickBreaks", [2, 2, 2]),
-                    "showTickLines": plot["options"].get("showTickLines", [[False, False], [False, False], [False, False]]),
-                    "tickLineColors": plot["options"].get("tickLineColors", [["#aaaaaa", "#aaaaaa"], ["#aaaaaa", "#aaaaaa"], ["#aaaaaa", "#aaaaaa"]])
-                })
-            else:
-                d["plots"].append({
-                    "plotType": plot["plotType"],
-                    "coordinates": plot["coordinates"],
-                    "colorBy": plot["colorBy"],
-                    "colorVar": plot["colorVar"],
-                    "name": plot["options"].get("name", None),
-                    "size": plot["options"].get("size", 1),
-                    "colorScale": plot["options"].get("colorScale", "Oranges"),
-                    "customColorScale": plot["options"].get("customColorScale", []),
-                    "colorScaleInverted": plot["options"].get("colorScaleInverted", False),
-                    "sortedCategories": plot["options"].get("sortedCategories", []),
-                    "showLegend": plot["options"].get("showLegend", False),
-                    "fontSize": plot["options"].get("fontSize", 11),
-                    "fontColor": plot["options"].get("fontColor", "black"),
-                    "legendTitle": plot["options"].get("legendTitle", None),
-                    "legendTitleFontSize": plot["options"].get("legendTitleFontSize", 16),
-                    "legendTitleFontColor": plot["options"].get("legendTitleFontColor", "black"),
-                    "legendPosition": plot["options"].get("legendPosition", None),
-                    "legendShowShape": plot["options"].get("legendShowShape", False),
-                    "showAxes": plot["options"].get("showAxes", [False, False, False]),
-                    "axisLabels": plot["options"].get("axisLabels", ["X", "Y", "Z"]),
-                    "axisColors": plot["options"].get("axisColors", ["#666666", "#666666", "#666666"]),
-                    "tickBreaks": plot["options"].get("tickBreaks", [2, 2, 2]),
-                    "showTickLines": plot["options"].get("showTickLines", [[False, False], [False, False], [False, False]]),
-                    "tickLineColors": plot["options"].get("tickLineColors", [["#aaaaaa", "#aaaaaa"], ["#aaaaaa", "#aaaaaa"], ["#aaaaaa", "#aaaaaa"]]),
-                    "hasAnimation": plot["options"].get("hasAnimation", False),
-                    "animationTargets": plot["options"].get("animationTargets", None),
-                    "animationDelay": plot["options"].get("animationDelay", None),
-                    "animationDuration": plot["options"].get("animationDuration", None),
-                    "animationLoop": plot["options"].get("animationLoop", False),
-                    "colnames": plot["options"].get("colnames", None),
-                    "rownames": plot["options"].get("rownames", None),
-                    "shape": plot["options"].get("shape", None),
-                    "shading": plot["options"].get("shading", True),
-                    "dpInfo": plot["options"].get("dpInfo", None),
-                    "labels": plot["options"].get("labels", None),
-                    "labelSize": plot["options"].get("labelSize", None),
-                    "labelColor": plot["options"].get("labelColor", None),
-                    "addClusterLabels": plot["options"].get("addClusterLabels", False)
-                })
+    @staticmethod
+    def _plot_to_dict(plot: dict) -> dict:
+        if plot["plotType"] == "imageStack":
+            return {
+                "plotType": "imageStack",
+                "values": plot["vals"],
+                "indices": plot["indices"],
+                "attributes": plot["attributes"],
+                "size": plot["options"].get("size", 1),
+                "colorScale": plot["options"].get("colorScale", None),
+                "showLegend": plot["options"].get("showLegend", False),
+                "fontSize": plot["options"].get("fontSize", 11),
+                "fontColor": plot["options"].get("fontColor", "black"),
+                "legendTitle": plot["options"].get(
+                    "legendTitle", None),
+                "legendTitleFontSize": plot["options"].get(
+                    "legendTitleFontSize", 16),
+                "legendTitleFontColor": plot["options"].get(
+                    "legendTitleFontColor", "black"),
+                "legendPosition": plot["options"].get(
+                    "legendPosition", None),
+                "showAxes": plot["options"].get(
+                    "showAxes", [False, False, False]),
+                "axisLabels": plot["options"].get(
+                    "axisLabels", ["X", "Y", "Z"]),
+                "axisColors": plot["options"].get(
+                    "axisColors", ["#666666", "#666666", "#666666"]),
+                "tickBreaks": plot["options"].get(
+                    "tickBreaks", [2, 2, 2]),
+                "showTickLines": plot["options"].get(
+                    "showTickLines",
+                    [[False, False], [False, False], [False, False]]),
+                "tickLineColors": plot["options"].get(
+                    "tickLineColors",
+                    [
+                        ["#aaaaaa", "#aaaaaa"],
+                        ["#aaaaaa", "#aaaaaa"],
+                        ["#aaaaaa", "#aaaaaa"]
+                    ]),
+                "intensityMode": plot["options"].get(
+                    "intensityMode", "alpha"),
+                "channelColors": plot["options"].get(
+                    "channelColors",
+                    ["#ff0000", "#00ff00", "#0000ff"]),
+                "channelOpacities": [1, 1, 1]
+            }
+        elif plot["plotType"] == "meshStream":
+            return {
+                "plotType": "meshStream",
+                "rootUrl": plot["rootUrl"],
+                "filePrefix": plot["filePrefix"],
+                "fileSuffix": plot["fileSuffix"],
+                "fileIteratorStart": plot["fileIteratorStart"],
+                "fileIteratorEnd": plot["fileIteratorEnd"],
+                "frameDelay": plot["frameDelay"],
+                "meshRotation": plot["options"].get("meshRotation", [0, 0, 0]),
+                "meshOffset": plot["options"].get("meshOffset", [0, 0, 0]),
+                "clearCoat": plot["options"].get("clearCoat", False),
+                "clearCoatIntensity": plot["options"].get("clearCoatIntensity", 1)
+            }
+        elif plot["plotType"] == "meshFrames":
+            # the babyplots json format has no packed mesh frames, so only
+            # the first frame is exported
+            return Babyplot._plot_to_dict(dict(plot, plotType="meshObject"))
+        elif plot["plotType"] == "meshObject":
+            return {
+                "plotType": "meshObject",
+                "meshString": plot["meshString"],
+                "meshScaling": plot["options"].get("meshScaling", [1, 1, 1]),
+                "meshRotation": plot["options"].get("meshRotation", [1, 1, 1]),
+                "meshOffset": plot["options"].get("meshOffset", [1, 1, 1]),
+                "showLegend": plot["options"].get("showLegend", False),
+                "fontSize": plot["options"].get("fontSize", 11),
+                "fontColor": plot["options"].get("fontColor", "black"),
+                "legendTitle": plot["options"].get("legendTitle", None),
+                "legendTitleFontSize": plot["options"].get("legendTitleFontSize", 16),
+                "legendTitleFontColor": plot["options"].get("legendTitleFontColor", "black"),
+                "legendPosition": plot["options"].get("legendPosition", None),
+                "legendShowShape": plot["options"].get("legendShowShape", False),
+                "showAxes": plot["options"].get("showAxes", [False, False, False]),
+                "axisLabels": plot["options"].get("axisLabels", ["X", "Y", "Z"]),
+                "axisColors": plot["options"].get("axisColors", ["#666666", "#666666", "#666666"]),
+                "tickBreaks": plot["options"].get("tickBreaks", [2, 2, 2]),
+                "showTickLines": plot["options"].get("showTickLines", [[False, False], [False, False], [False, False]]),
+                "tickLineColors": plot["options"].get("tickLineColors", [["#aaaaaa", "#aaaaaa"], ["#aaaaaa", "#aaaaaa"], ["#aaaaaa", "#aaaaaa"]])
+            }
+        else:
+            return {
+                "plotType": plot["plotType"],
+                "coordinates": plot["coordinates"],
+                "colorBy": plot["colorBy"],
+                "colorVar": plot["colorVar"],
+                "name": plot["options"].get("name", None),
+                "size": plot["options"].get("size", 1),
+                "colorScale": plot["options"].get("colorScale", "Oranges"),
+                "customColorScale": plot["options"].get("customColorScale", []),
+                "colorScaleInverted": plot["options"].get("colorScaleInverted", False),
+                "sortedCategories": plot["options"].get("sortedCategories", []),
+                "showLegend": plot["options"].get("showLegend", False),
+                "fontSize": plot["options"].get("fontSize", 11),
+                "fontColor": plot["options"].get("fontColor", "black"),
+                "legendTitle": plot["options"].get("legendTitle", None),
+                "legendTitleFontSize": plot["options"].get("legendTitleFontSize", 16),
+                "legendTitleFontColor": plot["options"].get("legendTitleFontColor", "black"),
+                "legendPosition": plot["options"].get("legendPosition", None),
+                "legendShowShape": plot["options"].get("legendShowShape", False),
+                "showAxes": plot["options"].get("showAxes", [False, False, False]),
+                "axisLabels": plot["options"].get("axisLabels", ["X", "Y", "Z"]),
+                "axisColors": plot["options"].get("axisColors", ["#666666", "#666666", "#666666"]),
+                "tickBreaks": plot["options"].get("tickBreaks", [2, 2, 2]),
+                "showTickLines": plot["options"].get("showTickLines", [[False, False], [False, False], [False, False]]),
+                "tickLineColors": plot["options"].get("tickLineColors", [["#aaaaaa", "#aaaaaa"], ["#aaaaaa", "#aaaaaa"], ["#aaaaaa", "#aaaaaa"]]),
+                "hasAnimation": plot["options"].get("hasAnimation", False),
+                "animationTargets": plot["options"].get("animationTargets", None),
+                "animationDelay": plot["options"].get("animationDelay", None),
+                "animationDuration": plot["options"].get("animationDuration", None),
+                "animationLoop": plot["options"].get("animationLoop", False),
+                "colnames": plot["options"].get("colnames", None),
+                "rownames": plot["options"].get("rownames", None),
+                "shape": plot["options"].get("shape", None),
+                "shading": plot["options"].get("shading", True),
+                "dpInfo": plot["options"].get("dpInfo", None),
+                "labels": plot["options"].get("labels", None),
+                "labelSize": plot["options"].get("labelSize", None),
+                "labelColor": plot["options"].get("labelColor", None),
+                "addClusterLabels": plot["options"].get("addClusterLabels", False)
+            }
 
-        return d
+    def save(self, path: str):
+        """Saves the Babyplot object in a compact binary file.
+
+        Unlike the json and html exports, the file can be loaded back into
+        python with Babyplot.load(). The data of the plots is stored as raw
+        arrays, which are memory-mapped when the file is loaded.
+
+        Parameters
+        ---
+        path: Filepath for the output.
+        """
+        save_container(path, self._settings(), self.plots)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "Babyplot":
+        """Loads a Babyplot object saved with the save() method.
+
+        Parameters
+        ---
+        path: File path of the saved Babyplot object.
+
+        mmap: If True, the coordinates, color variables and image data are
+        memory-mapped (read-only) instead of read into memory, so that even
+        large visualizations are loaded instantly.
+        """
+        settings, plots = load_container(path, mmap)
+        baby = cls(**settings)
+        baby.plots = plots
+        return baby
+
+    def _settings(self) -> dict:
+        """Arguments to recreate the Babyplot object without its plots."""
+        return {
+            "width": self.width,
+            "height": self.height,
+            "background_color": self.background_color,
+            "turntable": self.turntable,
+            "rotation_rate": self.rotation_rate,
+            "x_scale": self.x_scale,
+            "y_scale": self.y_scale,
+            "z_scale": self.z_scale,
+            "shape_legend_title": self.shape_legend_title,
+            "show_ui": self.show_ui,
+            "up_axis": self.upAxis,
+            "binary": self.binary,
+            "precision": self.precision,
+            "data": self.data,
+            "data_dir": self.data_dir,
+            "data_url": self.data_url,
+            "progressive": self.progressive
+        }
 
     def as_json(self):
         """Returns the babyplots visualization as a json formatted string."""
-        return json.dumps(self._to_dict())
+        start = perf_counter()
+        output = dumps(self._to_dict())
+        self._export_finished("as_json", start, 0, len(output))
+        return output
 
-    def save_as_json(self, path: str):
+    def save_as_json(self, path: Union[str, IO[str]]):
         """Saves the babyplots visualization as a json file.
 
+        The plots are serialized and written one at a time, so the complete
+        json document is never held in memory.
+
         Parameters
         ---
-        path: Filepath for the output.
+        path: Filepath for the output or a writable text file object.
         """
+        start = perf_counter()
+        write_seconds = 0
+        characters = 0
+        with _open_output(path) as outfile:
+            scene = dumps(self._scene_dict())
+            chunks = [scene[:-1], ', "plots": [']
+            for i, plot in enumerate(self.plots):
+                if i > 0:
+                    chunks.append(", ")
+                convert_start = perf_counter()
+                plot = self._wire_plot(plot, categories=False)
+                plot = self._plot_to_dict(plot)
+                self._record(
+                    "to_dict", perf_counter() - convert_start,
+                    plot=i, plotType=plot["plotType"])
+                chunks.append(dumps(plot))
+                write_start = perf_counter()
+                for chunk in chunks:
+                    outfile.write(chunk)
+                    characters += len(chunk)
+                write_seconds += perf_counter() - write_start
+                chunks = []
+            chunks.append("]}")
+            write_start = perf_counter()
+            for chunk in chunks:
+                outfile.write(chunk)
+                characters += len(chunk)
+            write_seconds += perf_counter() - write_start
+        self._export_finished("save_as_json", start, write_seconds, characters)
+
+
+def _plot_count(plot: dict) -> int:
+    """Number of data points (or voxels) of a plot in its stored format."""
+    if plot["plotType"] == "imageStack":
+        indices = plot["indices"]
+        if isinstance(indices, dict) and "lengths" in indices:
+            return int(np.sum(indices["lengths"]))
+        return len(indices)
+    if "coordinates" in plot:
+        return len(plot["coordinates"])
+    return 0
+
+
+@contextmanager
+def _open_output(path: Union[str, IO[str]]):
+    """Opens path for writing, or passes through an open file object."""
+    if hasattr(path, "write"):
+        yield path
+    else:
         with open(path, "w", encoding="utf-8") as outfile:
-            json.dump(self._to_dict(), outfile)
+            yield outfile
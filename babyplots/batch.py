@@ -0,0 +1,112 @@
+"""Export of many visualizations at once.
+
+The html files are rendered in a pool of processes. The babyplots library
+can either be embedded in every file or written once next to them and
+linked from each file, which makes the files much smaller.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Dict, Iterable, List, Union
+
+from babyplots.babyplots import Babyplot, _load_bpjs
+
+
+LIBRARY_MODES = ("inline", "linked")
+LIBRARY_FILE = "babyplots.js"
+
+
+def export_many(
+    figures: Union[Dict[str, Babyplot], Iterable[Babyplot]],
+    out_dir: str,
+    workers: int = None,
+    library: str = "linked",
+    fullscreen: bool = False,
+    compression: str = None
+) -> List[dict]:
+    """Saves many Babyplot objects as html files.
+
+    Parameters
+    ---
+    figures: Either a dictionary of file names and Babyplot objects, or a
+    list of Babyplot objects, which are saved as figure_1.html,
+    figure_2.html, etc. The file names are also used as page titles.
+
+    out_dir: Directory for the html files; created if it does not exist.
+
+    workers: Number of processes used to render the files. Defaults to the
+    number of CPUs; with 1, the files are rendered in this process.
+
+    library: Either "linked" (the babyplots library is written once as
+    babyplots.js to out_dir and loaded by every file) or "inline" (the
+    library is embedded in every file, so that each file can be opened on
+    its own).
+
+    fullscreen: If set to True, the visualizations will fill the viewport.
+
+    compression: Either None, "gzip" or "deflate". Compresses the plot data
+    (and the embedded library) of every file (see Babyplot.as_html()).
+
+    Returns
+    ---
+    A list with the path, size in bytes and the seconds spent rendering and
+    writing of each file, in the order of figures.
+
+    """
+    if library not in LIBRARY_MODES:
+        raise ValueError(
+            "library must be one of {}, not '{}'.".format(
+                LIBRARY_MODES, library))
+    if isinstance(figures, dict):
+        named = list(figures.items())
+    else:
+        named = [
+            ("figure_{}".format(i + 1), figure)
+            for i, figure in enumerate(figures)
+        ]
+    os.makedirs(out_dir, exist_ok=True)
+    library_url = None
+    if library == "linked":
+        with open(os.path.join(out_dir, LIBRARY_FILE), "w",
+                  encoding="utf-8") as outfile:
+            outfile.write(_load_bpjs())
+        library_url = LIBRARY_FILE
+
+    tasks = []
+    for name, figure in named:
+        filename = name if name.endswith(".html") else name + ".html"
+        path = os.path.join(out_dir, filename)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        title = os.path.splitext(os.path.basename(filename))[0]
+        url = None
+        if library_url is not None:
+            # file names may contain subdirectories
+            url = os.path.relpath(
+                os.path.join(out_dir, library_url), directory).replace(
+                    os.sep, "/")
+        tasks.append(
+            (figure, path, title, fullscreen, compression, url))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) < 2:
+        return [_export_one(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # send several figures to a process at once, to reduce the overhead
+        # of many small figures
+        chunksize = max(1, len(tasks) // (workers * 4))
+        return list(executor.map(_export_one, tasks, chunksize=chunksize))
+
+
+def _export_one(task: tuple) -> dict:
+    figure, path, title, fullscreen, compression, library_url = task
+    start = perf_counter()
+    figure.save_as_html(
+        path, fullscreen=fullscreen, title=title, compression=compression,
+        library_url=library_url)
+    return {
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "seconds": perf_counter() - start
+    }
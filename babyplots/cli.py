@@ -0,0 +1,231 @@
+"""Command line converter of tables and tiff image stacks to babyplots.
+
+Creates a standalone html file (or babyplots json file) with one plot from
+a csv, tsv, parquet or feather table or a tiff image stack, e.g.
+
+    babyplots cells.parquet -o cells.html --coords UMAP_1 UMAP_2 UMAP_3 \\
+        --color cluster --option showLegend=true
+    babyplots stack.tif -o stack.html --threshold 0.2 --compact
+
+Tables are read batch by batch, and only the selected columns (see
+tables.py). No notebook kernel is needed.
+"""
+
+import argparse
+import json
+import os
+import sys
+from time import perf_counter
+from typing import List
+import numpy as np
+
+from babyplots.babyplots import Babyplot, _plot_count
+from babyplots.encoding import COMPRESSION_FORMATS
+from babyplots.grid import GRID_PLOT_TYPES, pivot_plot
+from babyplots.lod import LOD_METHODS
+from babyplots.tables import BATCH_ROWS, read_plot_columns
+
+
+IMAGE_EXTENSIONS = (".tif", ".tiff")
+OUTPUT_FORMATS = ("html", "json")
+PLOT_TYPES = ("pointCloud", "shapeCloud", "heatMap", "surface", "line")
+COLOR_BY = ("categories", "values", "direct")
+
+
+def _option(text: str):
+    """Parses a KEY=VALUE plot option; values are parsed as json if
+    possible (e.g. true, 2, [1, 2]) and taken as strings otherwise."""
+    key, sep, value = text.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(
+            "options must be given as KEY=VALUE, not '{}'.".format(text))
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="babyplots",
+        description="Convert a table (csv, tsv, parquet, feather) or a tiff "
+        "image stack to a babyplots visualization.")
+    parser.add_argument("input", help="table or tiff file")
+    parser.add_argument(
+        "-o", "--output",
+        help="output file; defaults to the input file name with the "
+        "extension of the output format")
+    parser.add_argument(
+        "-f", "--format", choices=OUTPUT_FORMATS,
+        help="output format; defaults to the extension of the output file, "
+        "or html")
+    parser.add_argument(
+        "-v", "--verbose", action="store_true",
+        help="report the time and throughput of reading and writing")
+
+    table = parser.add_argument_group("tables")
+    table.add_argument(
+        "--coords", nargs="+", default=[], metavar="COLUMN",
+        help="coordinate columns; defaults to all columns except the color "
+        "column")
+    table.add_argument("--color", metavar="COLUMN", help="color column")
+    table.add_argument(
+        "--color-by", choices=COLOR_BY,
+        help="defaults to categories for text color columns, values for "
+        "numerical color columns and direct without a color column")
+    table.add_argument(
+        "--point-color", default="#1f77b4ff", metavar="COLOR",
+        help="color of all points (or cells) without a color column")
+    table.add_argument(
+        "--plot-type", choices=PLOT_TYPES, default="pointCloud")
+    table.add_argument(
+        "--max-points", type=int,
+        help="reduce point clouds to at most this many points")
+    table.add_argument("--lod", choices=LOD_METHODS, default="voxel")
+    table.add_argument(
+        "--max-grid", nargs="+", type=int, metavar="SIZE",
+        help="reduce heat maps and surfaces to at most this many rows and "
+        "columns (one number for both, or two); tables with three "
+        "coordinate columns are pivoted into a grid of the third column")
+    table.add_argument(
+        "--batch-rows", type=int, default=BATCH_ROWS,
+        help="number of rows read at once")
+
+    image = parser.add_argument_group("tiff image stacks")
+    image.add_argument("--threshold", type=float, default=0.1)
+    image.add_argument(
+        "--channel-thresholds", nargs="+", type=float, metavar="THRESHOLD")
+    image.add_argument(
+        "--compact", action="store_true",
+        help="store intensities at the bit depth of the image")
+
+    figure = parser.add_argument_group("visualization")
+    figure.add_argument(
+        "--option", action="append", type=_option, default=[],
+        metavar="KEY=VALUE",
+        help="plot option, e.g. showLegend=true or colorScale=Viridis; "
+        "can be given several times")
+    figure.add_argument("--title", default="Babyplot")
+    figure.add_argument("--background-color", default="#ffffffff")
+    figure.add_argument("--width", type=int, default=640)
+    figure.add_argument("--height", type=int, default=480)
+    figure.add_argument("--fullscreen", action="store_true")
+    figure.add_argument("--turntable", action="store_true")
+    figure.add_argument(
+        "--binary", action="store_true",
+        help="embed numerical data as binary buffers")
+    figure.add_argument(
+        "--precision", type=int,
+        help="significant digits of floating point values")
+    figure.add_argument("--compression", choices=COMPRESSION_FORMATS)
+    figure.add_argument(
+        "--library-url",
+        help="load the babyplots library from this url instead of "
+        "embedding it")
+    return parser
+
+
+def _log(verbose: bool, message: str, *args):
+    if verbose:
+        print(message.format(*args), file=sys.stderr)
+
+
+def _megabytes(n_bytes: int) -> float:
+    return n_bytes / 1024 ** 2
+
+
+def main(argv: List[str] = None):
+    """Entry point of the babyplots command."""
+    parser = _parser()
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    output = args.output
+    if fmt is None:
+        ext = os.path.splitext(output or "")[1].lower().lstrip(".")
+        fmt = ext if ext in OUTPUT_FORMATS else "html"
+    if output is None:
+        output = os.path.splitext(args.input)[0] + "." + fmt
+
+    bp = Babyplot(
+        width=args.width,
+        height=args.height,
+        background_color=args.background_color,
+        turntable=args.turntable,
+        binary=args.binary,
+        precision=args.precision
+    )
+    options = dict(args.option)
+    input_bytes = os.path.getsize(args.input)
+    start = perf_counter()
+    try:
+        if args.input.lower().endswith(IMAGE_EXTENSIONS):
+            bp.add_tiff(
+                args.input, args.threshold, args.channel_thresholds,
+                options, compact=args.compact)
+            count = _plot_count(bp.plots[0])
+            unit = "voxels"
+        else:
+            coordinates, color_var, count = read_plot_columns(
+                args.input, args.coords, args.color, args.batch_rows)
+            color_by = args.color_by
+            if color_by is None:
+                color_by = "direct" if color_var is None else (
+                    "values" if getattr(color_var, "dtype", None) is not None
+                    and color_var.dtype.kind in "biuf" else "categories")
+            max_grid = args.max_grid
+            if max_grid is not None and len(max_grid) == 1:
+                max_grid = max_grid[0]
+            lod_info = None
+            if (
+                args.plot_type in GRID_PLOT_TYPES
+                and coordinates.shape[1] == 3
+            ):
+                coordinates, color_var, options, lod_info = pivot_plot(
+                    coordinates[:, 0], coordinates[:, 1], coordinates[:, 2],
+                    color_var, options, max_grid)
+            if color_var is None:
+                # the babyplots library needs a color for every point (or
+                # cell of a grid)
+                if color_by != "direct":
+                    raise ValueError(
+                        "--color-by {} needs a color column.".format(color_by))
+                n_colors = (
+                    coordinates.size if args.plot_type in GRID_PLOT_TYPES
+                    else len(coordinates))
+                color_var = np.full(n_colors, args.point_color, dtype=object)
+            # the plot is added like by add_plot, keeping the description
+            # of the reduction of a pivoted grid
+            bp._add_coordinate_plot(
+                coordinates, args.plot_type, color_by, color_var, options,
+                args.max_points, args.lod, max_grid, lod_info)
+            unit = "rows"
+    except (KeyError, ValueError, ImportError) as e:
+        parser.error(str(e.args[0]) if e.args else str(e))
+    seconds = perf_counter() - start
+    _log(args.verbose,
+         "read {} {} from {} ({:.1f} MB) in {:.2f} s: {:.0f} {}/s, "
+         "{:.1f} MB/s",
+         count, unit, args.input, _megabytes(input_bytes), seconds,
+         count / seconds if seconds else 0, unit,
+         _megabytes(input_bytes) / seconds if seconds else 0)
+
+    if fmt == "html":
+        bp.save_as_html(
+            output, fullscreen=args.fullscreen, title=args.title,
+            compression=args.compression, library_url=args.library_url)
+    else:
+        bp.save_as_json(output)
+    export = bp._last_export
+    seconds = export["render_seconds"] + export["write_seconds"]
+    output_bytes = os.path.getsize(output)
+    _log(args.verbose,
+         "wrote {} ({:.1f} MB) in {:.2f} s (render {:.2f} s, write {:.2f} "
+         "s): {:.1f} MB/s",
+         output, _megabytes(output_bytes), seconds,
+         export["render_seconds"], export["write_seconds"],
+         _megabytes(output_bytes) / seconds if seconds else 0)
+
+
+if __name__ == "__main__":
+    main()
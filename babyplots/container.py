@@ -0,0 +1,228 @@
+"""Binary container format for saving and loading Babyplot objects.
+
+A container file consists of
+
+    - the magic bytes b"BABYPLOT",
+    - the format version and the length of the header in bytes (little
+      endian uint32 and uint64),
+    - a utf-8 encoded json header with the scene settings and the plots,
+      in which numpy arrays are replaced by {"__array__": <index>},
+    - the raw data of the arrays, each aligned to 64 bytes.
+
+The header lists the dtype, shape and offset (from the start of the array
+data) of every array, so that the arrays can be memory-mapped on load
+without reading the file.
+"""
+
+import json
+import struct
+from typing import List
+import numpy as np
+
+from babyplots.encoding import dumps
+
+
+MAGIC = b"BABYPLOT"
+VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sIQ")
+
+# plot entries holding per data point values, which are stored as arrays
+# even if they were given as lists
+DATA_KEYS = ("coordinates", "colorVar", "vals", "indices")
+# plot options with one value per data point, which are stored as arrays as
+# well, so that loading does not depend on their length
+POINT_OPTION_KEYS = ("labels", "dpInfo", "animationTargets")
+
+
+def _aligned(position: int) -> int:
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def save_container(path: str, scene: dict, plots: List[dict]):
+    """Write the scene settings and plots to a container file.
+
+    Parameters
+    ---
+    path: Filepath for the output.
+
+    scene: A json serializable dictionary of scene settings.
+
+    plots: The plots as stored in Babyplot.plots.
+
+    """
+    arrays = []
+    header = {
+        "scene": scene,
+        "plots": [
+            {
+                key: (
+                    _pack_options(value, arrays) if key == "options"
+                    else _pack(value, arrays, key in DATA_KEYS))
+                for key, value in plot.items()
+            }
+            for plot in plots
+        ]
+    }
+    offset = 0
+    header["arrays"] = []
+    for array in arrays:
+        header["arrays"].append({
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset
+        })
+        offset = _aligned(offset + array.nbytes)
+    encoded = dumps(header).encode("utf-8")
+    start = _aligned(_PREFIX.size + len(encoded))
+    with open(path, "wb") as outfile:
+        outfile.write(_PREFIX.pack(MAGIC, VERSION, len(encoded)))
+        outfile.write(encoded)
+        position = _PREFIX.size + len(encoded)
+        for array, entry in zip(arrays, header["arrays"]):
+            padding = start + entry["offset"] - position
+            outfile.write(b"\0" * padding)
+            outfile.write(array.data if array.size else b"")
+            position += padding + array.nbytes
+
+
+def load_container(path: str, mmap: bool = True):
+    """Read a container file.
+
+    Parameters
+    ---
+    path: File path of the container.
+
+    mmap: If True, the arrays are memory-mapped (read-only) instead of read
+    into memory.
+
+    Returns
+    ---
+    The scene settings and the list of plots.
+
+    """
+    with open(path, "rb") as infile:
+        magic, version, length = _PREFIX.unpack(infile.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError("'{}' is not a babyplots file.".format(path))
+        if version > VERSION:
+            raise ValueError(
+                "'{}' was written by a newer version of babyplots "
+                "(format version {}).".format(path, version))
+        header = json.loads(infile.read(length).decode("utf-8"))
+        start = _aligned(_PREFIX.size + length)
+        if mmap:
+            buffer = np.memmap(infile, dtype=np.uint8, mode="r")
+        else:
+            infile.seek(start)
+            buffer = np.frombuffer(infile.read(), dtype=np.uint8)
+            start = 0
+    arrays = []
+    for entry in header["arrays"]:
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        if count == 0:
+            array = np.empty(entry["shape"], dtype=dtype)
+        else:
+            array = np.frombuffer(
+                buffer, dtype=dtype, count=count,
+                offset=start + entry["offset"]).reshape(entry["shape"])
+        arrays.append(array)
+    plots = [
+        {key: _unpack(value, arrays) for key, value in plot.items()}
+        for plot in header["plots"]
+    ]
+    return header["scene"], plots
+
+
+def _pack(value, arrays: list, data: bool = False):
+    """Replaces the arrays in value by references into arrays.
+
+    Lists are only searched if their first item is an array or dictionary,
+    so that long per data point lists (e.g. dpInfo) are not traversed. Per
+    data point values (data is True) are converted to arrays, strings are
+    stored as categorical codes. Other unicode arrays (e.g. the per data
+    point options) are stored as they are.
+
+    """
+    import pandas as pd
+
+    if isinstance(value, pd.Series):
+        value = value.array if isinstance(
+            value.dtype, pd.CategoricalDtype) else value.to_numpy()
+    if isinstance(value, pd.Categorical):
+        return {
+            "__categorical__": _pack(np.asarray(value.codes), arrays),
+            "categories": _pack(value.categories.to_numpy(), arrays)
+        }
+    if data and isinstance(value, (list, tuple)):
+        try:
+            value = np.asarray(value)
+        except ValueError:
+            # ragged nested lists
+            return value
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "biuf" or (
+                value.dtype.kind == "U" and not data):
+            value = np.ascontiguousarray(value)
+            # arrays used by several plots are stored once
+            for i, array in enumerate(arrays):
+                if array is value:
+                    return {"__array__": i}
+            arrays.append(value)
+            return {"__array__": len(arrays) - 1}
+        if data and value.ndim == 1:
+            return _pack(pd.Categorical(value), arrays)
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {key: _pack(item, arrays) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and len(value) > 0 and isinstance(
+            value[0], (np.ndarray, dict)):
+        return [_pack(item, arrays) for item in value]
+    return value
+
+
+def _pack_options(options: dict, arrays: list) -> dict:
+    """Packs the options of a plot, storing the per data point options as
+    arrays.
+
+    Strings are stored as fixed width unicode arrays, which are
+    memory-mapped on load like numerical arrays, unless a few long strings
+    would make the array much larger than the strings themselves.
+
+    """
+    packed = {}
+    for key, value in options.items():
+        if key in POINT_OPTION_KEYS and isinstance(value, (list, tuple)):
+            try:
+                array = np.asarray(value)
+            except ValueError:
+                # ragged nested lists
+                array = None
+            if array is not None and (
+                    array.dtype.kind in "biuf" or array.dtype.kind == "U"
+                    and array.size and array.dtype.itemsize // 4 <= 16
+                    + 4 * np.char.str_len(array).mean()):
+                value = array
+        packed[key] = _pack(value, arrays)
+    return packed
+
+
+def _unpack(value, arrays: list):
+    """Replaces the array references in value by the arrays."""
+    if isinstance(value, dict):
+        if "__array__" in value:
+            return arrays[value["__array__"]]
+        if "__categorical__" in value:
+            import pandas as pd
+
+            return pd.Categorical.from_codes(
+                _unpack(value["__categorical__"], arrays),
+                _unpack(value["categories"], arrays))
+        return {key: _unpack(item, arrays) for key, item in value.items()}
+    if isinstance(value, list) and len(value) > 0 and isinstance(
+            value[0], dict):
+        return [_unpack(item, arrays) for item in value]
+    return value
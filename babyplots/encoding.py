@@ -0,0 +1,361 @@
+"""Binary encoding and compression of plot data.
+
+Numerical arrays can be shipped to the browser as base64 encoded typed array
+buffers instead of JSON number lists. An encoded array is a dictionary of the
+form {"__ndarray__": <base64 string>, "dtype": <dtype name>, "shape": <shape>}
+that is decoded into javascript typed arrays by the bpDecode function in the
+templates.
+
+All json is written with dumps, which uses orjson if it is installed (or the
+backend chosen with set_json_backend) and the json module otherwise.
+"""
+
+import base64
+import gzip
+import json
+import zlib
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# dtypes that have an equivalent javascript typed array
+TYPED_ARRAY_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float64": np.dtype("<f8"),
+    "int8": np.dtype("i1"),
+    "uint8": np.dtype("u1"),
+    "int16": np.dtype("<i2"),
+    "uint16": np.dtype("<u2"),
+    "int32": np.dtype("<i4"),
+    "uint32": np.dtype("<u4"),
+}
+
+
+def as_typed_array(values, float_dtype: str = "float32"):
+    """Convert values to a numpy array with a typed array compatible dtype.
+
+    Floating point values are converted to float_dtype, integers to int32 (or
+    float64 if they exceed the int32 range) and booleans to uint8. Returns
+    None if the values are not numerical (e.g. strings or hex colors), in
+    which case they can not be binary encoded.
+
+    """
+    try:
+        array = np.asarray(values)
+    except ValueError:
+        # ragged nested lists
+        return None
+    if array.dtype.kind == "f":
+        return array.astype(float_dtype, copy=False)
+    if array.dtype.kind in "iu":
+        if array.dtype.name in TYPED_ARRAY_DTYPES and array.itemsize <= 4:
+            return array
+        if array.size and (
+                array.max() > 2 ** 31 - 1 or array.min() < -2 ** 31):
+            # too large for int32, but exactly representable as float64
+            return array.astype(np.float64)
+        return array.astype(np.int32, copy=False)
+    if array.dtype.kind == "b":
+        return array.astype(np.uint8)
+    return None
+
+
+def encode_array(array: np.ndarray) -> dict:
+    """Encode a numpy array as a base64 typed array buffer.
+
+    Parameters
+    ---
+    array: A numpy array with one of the dtypes in TYPED_ARRAY_DTYPES.
+
+    """
+    dtype = TYPED_ARRAY_DTYPES.get(array.dtype.name)
+    if dtype is None:
+        raise TypeError(
+            "Can not binary encode array of dtype '{}'.".format(array.dtype))
+    buffer = np.ascontiguousarray(array, dtype=dtype)
+    return {
+        "__ndarray__": base64.b64encode(buffer.data).decode("ascii"),
+        "dtype": dtype.name,
+        "shape": list(buffer.shape)
+    }
+
+
+def encode_buffers(value: dict, encode=encode_array) -> dict:
+    """Binary encode the arrays of a quantized, run-length or dictionary
+    encoded value (see quantize, run_length and encode_categories)."""
+    return {
+        key: encode(item) if isinstance(item, np.ndarray) else item
+        for key, item in value.items()
+    }
+
+
+def round_significant(values, digits: int) -> np.ndarray:
+    """Round floating point values to a number of significant digits.
+
+    The rounded values are returned as float64, whose shortest decimal
+    representation has at most the given number of digits, which makes the
+    json output smaller.
+
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    magnitude[~np.isfinite(magnitude)] = 0
+    exponent = digits - 1 - magnitude
+    # the scale factor is always an exact integer power of ten: values are
+    # multiplied by it for positive exponents and divided by it otherwise
+    scale = 10.0 ** np.abs(exponent)
+    return np.where(
+        exponent >= 0,
+        np.round(values * scale) / scale,
+        np.round(values / scale) * scale)
+
+
+def buffer_encoder(buffers: list):
+    """Create an encode function that collects typed arrays in buffers.
+
+    The returned function can be used instead of encode_array for arrays
+    that are sent as separate binary buffers (e.g. in a comm message). It
+    appends the bytes of the array to buffers and returns a reference
+    {"__ndarray__": <index in buffers>, "dtype": ..., "shape": ...}.
+
+    """
+    def encode(array: np.ndarray) -> dict:
+        dtype = TYPED_ARRAY_DTYPES[array.dtype.name]
+        array = np.ascontiguousarray(array, dtype=dtype)
+        buffers.append(memoryview(array).cast("B"))
+        return {
+            "__ndarray__": len(buffers) - 1,
+            "dtype": dtype.name,
+            "shape": list(array.shape)
+        }
+    return encode
+
+
+def json_default(obj):
+    """Default function for json.dumps that converts numpy objects.
+
+    Arrays are written as (nested) lists; arrays that should be sent as
+    binary buffers are encoded with encode_array beforehand.
+
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(
+            type(obj).__name__))
+
+
+JSON_BACKENDS = ("orjson", "json")
+_json_backend = "orjson" if orjson is not None else "json"
+
+
+def set_json_backend(backend: str):
+    """Choose the library used to write json.
+
+    Parameters
+    ---
+    backend: Either "orjson" (default if it is installed), which writes
+    numpy arrays directly and is considerably faster for large plots, or
+    "json" (the python standard library).
+
+    """
+    global _json_backend
+    if backend not in JSON_BACKENDS:
+        raise ValueError(
+            "backend must be one of {}, not '{}'.".format(
+                JSON_BACKENDS, backend))
+    if backend == "orjson" and orjson is None:
+        raise ImportError("The 'orjson' json backend is not installed.")
+    _json_backend = backend
+
+
+def dumps(obj, sort_keys: bool = False, **kwargs) -> str:
+    """Serialize obj to a json string with the selected json backend.
+
+    Numpy arrays and scalars are supported. Further keyword arguments are
+    only passed on to json.dumps, which makes this function usable as the
+    json.dumps_function policy of jinja2.
+
+    """
+    if _json_backend == "orjson":
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=json_default, option=option).decode(
+            "utf-8")
+    kwargs.setdefault("default", json_default)
+    return json.dumps(obj, sort_keys=sort_keys, **kwargs)
+
+
+# compression formats supported by the browsers' DecompressionStream
+COMPRESSION_FORMATS = ("gzip", "deflate")
+
+
+def compress(data: bytes, compression: str) -> str:
+    """Compress data and return it as a base64 string.
+
+    Parameters
+    ---
+    data: The bytes to compress.
+
+    compression: Either "gzip" or "deflate" (zlib format).
+
+    """
+    if compression == "gzip":
+        compressed = gzip.compress(data, compresslevel=6)
+    elif compression == "deflate":
+        compressed = zlib.compress(data, 6)
+    else:
+        raise ValueError(
+            "compression must be one of {}, not '{}'.".format(
+                COMPRESSION_FORMATS, compression))
+    return base64.b64encode(compressed).decode("ascii")
+
+
+def smallest_uint(max_value: int):
+    """Smallest unsigned typed array dtype that can hold max_value.
+
+    Falls back to float64, which holds integers exactly up to 2**53.
+
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.float64
+
+
+def quantize(values, bits: int = 8, offset: float = None,
+             scale: float = None) -> dict:
+    """Quantize floating point values to 8 or 16 bit unsigned integers.
+
+    The values are reconstructed as offset + q * scale. By default, offset
+    and scale map the range of the values to the full integer range.
+
+    Parameters
+    ---
+    values: The values to quantize.
+
+    bits: Either 8 or 16.
+
+    offset: Value corresponding to the quantized value 0.
+
+    scale: Difference between values of consecutive quantized values.
+
+    """
+    if bits not in (8, 16):
+        raise ValueError("bits must be 8 or 16, not {}.".format(bits))
+    values = np.asarray(values, dtype=np.float64)
+    levels = 2 ** bits - 1
+    if offset is None:
+        offset = float(values.min()) if values.size else 0.0
+    if scale is None:
+        span = float(values.max()) - offset if values.size else 0.0
+        scale = span / levels if span > 0 else 1.0
+    q = np.rint((values - offset) / scale)
+    np.clip(q, 0, levels, out=q)
+    return {
+        "__quantized__": q.astype(np.uint8 if bits == 8 else np.uint16),
+        "offset": offset,
+        "scale": scale
+    }
+
+
+def run_length(indices) -> dict:
+    """Encode sorted indices as runs of consecutive values.
+
+    Each run is given by its first index and its length.
+
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if indices.size == 0:
+        starts = lengths = np.empty(0, dtype=np.int64)
+    else:
+        breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+        bounds = np.concatenate([[0], breaks, [indices.size]])
+        starts = indices[bounds[:-1]]
+        lengths = np.diff(bounds)
+    return {
+        "__runs__": True,
+        "starts": starts.astype(
+            smallest_uint(int(starts.max()) if starts.size else 0)),
+        "lengths": lengths.astype(
+            smallest_uint(int(lengths.max()) if lengths.size else 0))
+    }
+
+
+def dequantize(value: dict) -> np.ndarray:
+    """Reconstruct the values of a quantized array (see quantize)."""
+    return value["offset"] + np.asarray(
+        value["__quantized__"], dtype=np.float64) * value["scale"]
+
+
+def decode_runs(value: dict) -> np.ndarray:
+    """Expand runs of consecutive indices (see run_length) into the
+    indices."""
+    starts = np.asarray(value["starts"], dtype=np.int64)
+    lengths = np.asarray(value["lengths"], dtype=np.int64)
+    # position of each index within its run
+    offsets = np.arange(int(lengths.sum())) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+def encode_categories(values, sorted_categories=None) -> dict:
+    """Dictionary encode categorical values as integer codes and levels.
+
+    Parameters
+    ---
+    values: The category of each data point (list, numpy array or pandas
+    Categorical / categorical Series).
+
+    sorted_categories: Categories that should come first in the levels, in
+    the given order. The remaining levels are sorted.
+
+    """
+    import pandas as pd
+
+    if isinstance(values, pd.Series):
+        values = values.array
+    if isinstance(values, pd.Categorical):
+        codes = np.asarray(values.codes, dtype=np.int64)
+        levels = list(values.categories)
+        if (codes < 0).any():
+            # missing values
+            codes = np.where(codes < 0, len(levels), codes)
+            levels.append(None)
+    else:
+        codes, levels = pd.factorize(
+            np.asarray(values), sort=True, use_na_sentinel=False)
+        levels = levels.tolist()
+    # plain python levels, with missing values as None (null in json)
+    levels = [
+        None if pd.isna(level) else
+        level.item() if isinstance(level, np.generic) else level
+        for level in levels
+    ]
+    if sorted_categories:
+        first = [level for level in sorted_categories if level in levels]
+        order = first + [level for level in levels if level not in first]
+        position = {level: i for i, level in enumerate(order)}
+        remap = np.array([position[level] for level in levels],
+                         dtype=np.int64)
+        codes = remap[codes] if len(remap) else codes
+        levels = order
+    return {
+        "__categories__": codes.astype(smallest_uint(max(len(levels) - 1, 0))),
+        "levels": levels
+    }
+
+
+def decode_categories(value: dict) -> list:
+    """Expand dictionary encoded categories into a list of categories."""
+    levels = np.empty(len(value["levels"]), dtype=object)
+    levels[:] = value["levels"]
+    return levels[value["__categories__"]].tolist()
@@ -0,0 +1,534 @@
+"""Reading, writing and simplification of glTF 2.0 models.
+
+Models are passed to the page as the "meshString" of meshObject plots,
+which the babyplots library loads with Babylon.js as a data url. glTF json
+files are passed as text, binary glTF (.glb) files, and .gltf files that
+had to be modified, as base64 encoded glb data prefixed with its media type
+(see mesh_string).
+
+Meshes are simplified by vertex clustering: the vertices are snapped to a
+regular grid, the vertices of each grid cell are merged into one at their
+mean position and triangles that collapse are removed. The grid is chosen
+per mesh primitive to come close to its share of the target number of
+triangles.
+"""
+
+import base64
+import json
+import os
+import struct
+from typing import Optional, Tuple
+import numpy as np
+
+
+GLB_MAGIC = b"glTF"
+GLB_MEDIA_TYPE = "model/gltf-binary"
+_JSON_CHUNK = 0x4E4F534A
+_BIN_CHUNK = 0x004E4942
+_HEADER = struct.Struct("<4sII")
+_CHUNK = struct.Struct("<II")
+
+COMPONENT_DTYPES = {
+    5120: np.dtype("i1"),
+    5121: np.dtype("u1"),
+    5122: np.dtype("<i2"),
+    5123: np.dtype("<u2"),
+    5125: np.dtype("<u4"),
+    5126: np.dtype("<f4"),
+}
+TYPE_SIZES = {
+    "SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4,
+    "MAT2": 4, "MAT3": 9, "MAT4": 16,
+}
+TRIANGLES = 4
+# vertex attributes that are averaged when vertices are merged
+MERGED_ATTRIBUTES = ("POSITION", "NORMAL", "TEXCOORD_", "COLOR_")
+# extensions that do not refer to accessors or buffer views, so that unused
+# accessors and buffer views can be removed
+_COMPACTABLE_EXTENSIONS = (
+    "KHR_materials_", "KHR_texture_transform", "KHR_lights_punctual")
+_MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg",
+               ".jpeg": "image/jpeg"}
+
+
+def _align(n: int) -> int:
+    return -(-n // 4) * 4
+
+
+def _data_uri_bytes(uri: str) -> bytes:
+    return base64.b64decode(uri.split(",", 1)[1])
+
+
+def read_gltf(path: str) -> Tuple[dict, bytearray]:
+    """Reads a .gltf or .glb file.
+
+    The data of all buffers, including external files and base64 data uris,
+    is merged into a single binary buffer, as in glb files. External images
+    are embedded as well.
+
+    Returns
+    ---
+    The glTF json document and its binary buffer.
+
+    """
+    directory = os.path.dirname(path)
+    with open(path, "rb") as infile:
+        data = infile.read()
+    chunks = {}
+    if data[:4] == GLB_MAGIC:
+        _, version, length = _HEADER.unpack_from(data)
+        if version != 2:
+            raise ValueError(
+                "Only glTF 2.0 files are supported, '{}' has version "
+                "{}.".format(path, version))
+        position = _HEADER.size
+        while position < length:
+            chunk_length, chunk_type = _CHUNK.unpack_from(data, position)
+            position += _CHUNK.size
+            chunks.setdefault(
+                chunk_type, data[position:position + chunk_length])
+            position += chunk_length
+        document = json.loads(chunks[_JSON_CHUNK].decode("utf-8"))
+    else:
+        document = json.loads(data.decode("utf-8"))
+
+    binary = bytearray()
+    starts = []
+    for i, buffer in enumerate(document.get("buffers", [])):
+        uri = buffer.get("uri")
+        if uri is None:
+            # the binary chunk of a glb file
+            content = chunks.get(_BIN_CHUNK, b"")
+        elif uri.startswith("data:"):
+            content = _data_uri_bytes(uri)
+        else:
+            with open(os.path.join(directory, uri), "rb") as infile:
+                content = infile.read()
+        binary.extend(b"\0" * (_align(len(binary)) - len(binary)))
+        starts.append(len(binary))
+        binary.extend(content[:buffer["byteLength"]])
+    for view in document.get("bufferViews", []):
+        view["byteOffset"] = starts[view["buffer"]] + view.get(
+            "byteOffset", 0)
+        view["buffer"] = 0
+    for image in document.get("images", []):
+        uri = image.get("uri")
+        if uri is None or uri.startswith("data:"):
+            continue
+        with open(os.path.join(directory, uri), "rb") as infile:
+            view = _append_view(document, binary, infile.read())
+        del image["uri"]
+        image["bufferView"] = view
+        image["mimeType"] = _MIME_TYPES.get(
+            os.path.splitext(uri)[1].lower(), "image/png")
+    _set_buffer(document, binary)
+    return document, binary
+
+
+def write_glb(document: dict, binary: bytes) -> bytes:
+    """Returns the glb file of a glTF document and its binary buffer."""
+    document = dict(document)
+    _set_buffer(document, binary)
+    encoded = json.dumps(document, separators=(",", ":")).encode("utf-8")
+    encoded += b" " * (_align(len(encoded)) - len(encoded))
+    parts = [_CHUNK.pack(len(encoded), _JSON_CHUNK), encoded]
+    if binary:
+        padded = _align(len(binary))
+        parts += [_CHUNK.pack(padded, _BIN_CHUNK), bytes(binary),
+                  b"\0" * (padded - len(binary))]
+    length = _HEADER.size + sum(len(part) for part in parts)
+    return b"".join([_HEADER.pack(GLB_MAGIC, 2, length)] + parts)
+
+
+def _set_buffer(document: dict, binary: bytes):
+    if binary:
+        document["buffers"] = [{"byteLength": len(binary)}]
+    else:
+        document.pop("buffers", None)
+
+
+def mesh_string(path: str, target_triangles: int = None) -> str:
+    """Returns the meshString of a meshObject plot from a glTF file.
+
+    Parameters
+    ---
+    path: File path of a .gltf or .glb file.
+
+    target_triangles: If set, the meshes are simplified to about this
+    number of triangles in total.
+
+    """
+    if target_triangles is None:
+        with open(path, "rb") as infile:
+            data = infile.read()
+        if data[:4] == GLB_MAGIC:
+            return glb_string(data)
+        text = data.decode("utf-8")
+        document = json.loads(text)
+        uris = [b.get("uri") for b in document.get("buffers", [])] + [
+            i.get("uri") for i in document.get("images", [])]
+        if all(uri is None or uri.startswith("data:") for uri in uris):
+            # self-contained glTF json is loaded as is
+            return text
+    document, binary = read_gltf(path)
+    if target_triangles is not None:
+        document, binary = simplify(document, binary, target_triangles)
+    return glb_string(write_glb(document, binary))
+
+
+def glb_string(data: bytes) -> str:
+    """The meshString of a glb model."""
+    return "{};base64,{}".format(
+        GLB_MEDIA_TYPE, base64.b64encode(data).decode("ascii"))
+
+
+def read_accessor(document: dict, binary: bytes, index: int) -> np.ndarray:
+    """Reads the data of an accessor as an array with one row per element.
+
+    Returns None for sparse accessors.
+
+    """
+    accessor = document["accessors"][index]
+    if "sparse" in accessor:
+        return None
+    dtype = COMPONENT_DTYPES[accessor["componentType"]]
+    size = TYPE_SIZES[accessor["type"]]
+    count = accessor["count"]
+    if "bufferView" not in accessor:
+        return np.zeros((count, size), dtype=dtype)
+    view = document["bufferViews"][accessor["bufferView"]]
+    stride = view.get("byteStride", dtype.itemsize * size)
+    return np.ndarray(
+        shape=(count, size), dtype=dtype, buffer=binary,
+        offset=view["byteOffset"] + accessor.get("byteOffset", 0),
+        strides=(stride, dtype.itemsize)).copy()
+
+
+def _append_view(document: dict, binary: bytearray, data: bytes,
+                 target: int = None) -> int:
+    """Appends data to the binary buffer as a new buffer view."""
+    binary.extend(b"\0" * (_align(len(binary)) - len(binary)))
+    view = {"buffer": 0, "byteOffset": len(binary), "byteLength": len(data)}
+    if target is not None:
+        view["target"] = target
+    binary.extend(data)
+    document.setdefault("bufferViews", []).append(view)
+    return len(document["bufferViews"]) - 1
+
+
+def _append_accessor(document: dict, binary: bytearray, array: np.ndarray,
+                     accessor_type: str, target: int = None,
+                     bounds: bool = False) -> int:
+    """Appends an array as a new accessor (with its own buffer view)."""
+    component = {
+        dtype: component for component, dtype in COMPONENT_DTYPES.items()
+    }[array.dtype]
+    accessor = {
+        "bufferView": _append_view(
+            document, binary, np.ascontiguousarray(array).tobytes(), target),
+        "componentType": component,
+        "count": len(array),
+        "type": accessor_type
+    }
+    if bounds and len(array):
+        # glTF only allows empty accessors without bounds
+        accessor["min"] = array.min(axis=0).tolist()
+        accessor["max"] = array.max(axis=0).tolist()
+    document.setdefault("accessors", []).append(accessor)
+    return len(document["accessors"]) - 1
+
+
+def _triangle_count(document: dict, primitive: dict) -> int:
+    if primitive.get("mode", TRIANGLES) != TRIANGLES:
+        return 0
+    if "indices" in primitive:
+        return document["accessors"][primitive["indices"]]["count"] // 3
+    return document["accessors"][primitive["attributes"]["POSITION"]][
+        "count"] // 3
+
+
+def _can_simplify(document: dict, primitive: dict) -> bool:
+    """Whether a primitive is a plain triangle mesh with float attributes
+    that can be averaged (no morph targets, skins or compression)."""
+    if (
+        primitive.get("mode", TRIANGLES) != TRIANGLES
+        or "targets" in primitive
+        or "extensions" in primitive
+        or "POSITION" not in primitive["attributes"]
+    ):
+        return False
+    for name, index in primitive["attributes"].items():
+        accessor = document["accessors"][index]
+        if (
+            not name.startswith(MERGED_ATTRIBUTES)
+            or accessor["componentType"] != 5126
+            or "sparse" in accessor
+        ):
+            return False
+    return True
+
+
+def simplify(document: dict, binary: bytearray,
+             target_triangles: int) -> Tuple[dict, bytearray]:
+    """Simplifies the meshes of a glTF model by vertex clustering.
+
+    Each triangle primitive gets a share of target_triangles in proportion
+    to its number of triangles. Primitives with morph targets, skinning or
+    compressed data are kept as they are, as are primitives of which no
+    triangle would remain at their share. Vertex attributes (normals,
+    texture coordinates, colors) are averaged over the merged vertices.
+
+    Parameters
+    ---
+    document: The glTF json document, as returned by read_gltf().
+
+    binary: Its binary buffer.
+
+    target_triangles: Number of triangles of the simplified model.
+
+    Returns
+    ---
+    The simplified document and binary buffer.
+
+    """
+    primitives = [
+        primitive
+        for mesh in document.get("meshes", [])
+        for primitive in mesh["primitives"]
+    ]
+    total = sum(_triangle_count(document, p) for p in primitives)
+    if total <= target_triangles:
+        return document, binary
+    ratio = target_triangles / total
+    binary = bytearray(binary)
+    # primitives sharing their vertex data are simplified once
+    simplified = {}
+    for primitive in primitives:
+        if not _can_simplify(document, primitive):
+            continue
+        key = (
+            tuple(sorted(primitive["attributes"].items())),
+            primitive.get("indices"))
+        if key not in simplified:
+            simplified[key] = _simplify_primitive(
+                document, binary, primitive,
+                max(1, int(_triangle_count(document, primitive) * ratio)))
+        if simplified[key] is None:
+            continue
+        attributes, indices = simplified[key]
+        primitive["attributes"] = dict(attributes)
+        primitive["indices"] = indices
+    return _compact(document, binary)
+
+
+def _simplify_primitive(document: dict, binary: bytearray, primitive: dict,
+                        target: int) -> Optional[Tuple[dict, int]]:
+    """Simplifies one primitive and appends its new accessors.
+
+    Returns
+    ---
+    The accessor indices of the new attributes and indices, or None if no
+    triangle remains.
+
+    """
+    positions = read_accessor(
+        document, binary, primitive["attributes"]["POSITION"]).astype(
+            np.float64)
+    if "indices" in primitive:
+        triangles = read_accessor(
+            document, binary, primitive["indices"]).astype(np.int64)
+    else:
+        triangles = np.arange(len(positions), dtype=np.int64)
+    triangles = triangles[:len(triangles) // 3 * 3].reshape(-1, 3)
+    cluster, triangles = cluster_vertices(positions, triangles, target)
+    if len(triangles) == 0:
+        return None
+
+    # only clusters that are part of a remaining triangle are kept
+    used, triangles = np.unique(triangles, return_inverse=True)
+    triangles = triangles.reshape(-1, 3)
+    remap = np.full(cluster.max() + 1 if len(cluster) else 0, -1)
+    remap[used] = np.arange(len(used))
+    cluster = remap[cluster]
+    members = cluster >= 0
+    counts = np.bincount(cluster[members], minlength=len(used))
+
+    attributes = {}
+    for name, index in sorted(primitive["attributes"].items()):
+        values = read_accessor(document, binary, index)[members].astype(
+            np.float64)
+        merged = np.column_stack([
+            np.bincount(cluster[members], weights=values[:, k],
+                        minlength=len(used))
+            for k in range(values.shape[1])
+        ]) / np.maximum(counts, 1)[:, None]
+        if name == "NORMAL":
+            length = np.linalg.norm(merged, axis=1, keepdims=True)
+            merged = merged / np.where(length > 0, length, 1)
+        attributes[name] = _append_accessor(
+            document, binary, merged.astype(np.float32),
+            document["accessors"][index]["type"], target=34962,
+            bounds=name == "POSITION")
+    dtype = np.uint16 if len(used) < 2 ** 16 else np.uint32
+    indices = _append_accessor(
+        document, binary, triangles.astype(dtype).ravel(), "SCALAR",
+        target=34963)
+    return attributes, indices
+
+
+def _cluster_grid(positions: np.ndarray, triangles: np.ndarray,
+                  resolution: int):
+    """Clusters the vertices on a grid of resolution cells along the
+    largest extent and returns the vertex clusters and the triangles
+    between three different clusters (without duplicates)."""
+    low = positions.min(axis=0)
+    extent = positions.max(axis=0) - low
+    size = max(extent.max(), np.finfo(np.float64).tiny) / resolution
+    shape = np.floor(extent / size).astype(np.int64) + 1
+    cells = np.minimum(
+        np.floor((positions - low) / size).astype(np.int64), shape - 1)
+    keys = (cells[:, 0] * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+    cluster = np.unique(keys, return_inverse=True)[1].ravel()
+    merged = cluster[triangles]
+    keep = (
+        (merged[:, 0] != merged[:, 1])
+        & (merged[:, 1] != merged[:, 2])
+        & (merged[:, 0] != merged[:, 2])
+    )
+    merged = merged[keep]
+    # triangles between the same clusters are kept once
+    corners = np.ascontiguousarray(np.sort(merged, axis=1))
+    first = np.unique(
+        corners.view(np.dtype((np.void, corners.dtype.itemsize * 3))),
+        return_index=True)[1]
+    return cluster, merged[np.sort(first)]
+
+
+def cluster_vertices(positions: np.ndarray, triangles: np.ndarray,
+                     target: int, max_iter: int = 8):
+    """Merges vertices by clustering them on a regular grid.
+
+    The number of grid cells is adjusted so that the number of remaining
+    triangles comes close to, without exceeding, target (if possible).
+
+    Parameters
+    ---
+    positions: Vertex positions (n x 3 array).
+
+    triangles: Vertex indices of the triangles (m x 3 array).
+
+    target: Number of triangles after merging.
+
+    max_iter: Maximum number of grid sizes tried.
+
+    Returns
+    ---
+    The cluster of each vertex and the triangles between the clusters.
+
+    """
+    if len(triangles) <= target or len(positions) == 0:
+        return np.arange(len(positions)), triangles
+    # the number of triangles of a clustered surface grows roughly with the
+    # square of the grid resolution
+    resolution = max(1.0, np.sqrt(target / 2))
+    best = None
+    tried = {}
+    for _ in range(max_iter):
+        cells = int(round(min(resolution, 2 ** 20)))
+        if cells in tried:
+            break
+        cluster, merged = _cluster_grid(positions, triangles, cells)
+        tried[cells] = len(merged)
+        if len(merged) <= target and (
+                best is None or len(merged) > len(best[1])):
+            best = (cluster, merged)
+        if target * 0.95 <= len(merged) <= target:
+            break
+        resolution = cells * np.sqrt(target / max(len(merged), 1))
+        if len(merged) > target:
+            # approach the target from below
+            resolution = min(resolution, cells - 1) if cells > 1 else 1
+    if best is None:
+        best = _cluster_grid(positions, triangles, 1)
+    return best
+
+
+def _compact(document: dict, binary: bytearray) -> Tuple[dict, bytearray]:
+    """Removes unused accessors and buffer views and the unused parts of the
+    binary buffer.
+
+    Only done if the model uses no extensions that might refer to accessors
+    or buffer views.
+
+    """
+    if not all(
+            name.startswith(_COMPACTABLE_EXTENSIONS)
+            for name in document.get("extensionsUsed", [])):
+        return document, binary
+
+    def accessor_refs():
+        # (container, key) pairs holding accessor indices
+        for mesh in document.get("meshes", []):
+            for primitive in mesh["primitives"]:
+                for name in primitive["attributes"]:
+                    yield primitive["attributes"], name
+                if "indices" in primitive:
+                    yield primitive, "indices"
+                for target in primitive.get("targets", []):
+                    for name in target:
+                        yield target, name
+        for skin in document.get("skins", []):
+            if "inverseBindMatrices" in skin:
+                yield skin, "inverseBindMatrices"
+        for animation in document.get("animations", []):
+            for sampler in animation["samplers"]:
+                yield sampler, "input"
+                yield sampler, "output"
+
+    accessors = document.get("accessors", [])
+    used = sorted({container[key] for container, key in accessor_refs()})
+    new_index = {old: new for new, old in enumerate(used)}
+    for container, key in list(accessor_refs()):
+        container[key] = new_index[container[key]]
+    document["accessors"] = [accessors[i] for i in used]
+
+    def view_refs():
+        for accessor in document["accessors"]:
+            if "bufferView" in accessor:
+                yield accessor, "bufferView"
+            sparse = accessor.get("sparse")
+            if sparse is not None:
+                yield sparse["indices"], "bufferView"
+                yield sparse["values"], "bufferView"
+        for image in document.get("images", []):
+            if "bufferView" in image:
+                yield image, "bufferView"
+
+    views = document.get("bufferViews", [])
+    used = sorted({container[key] for container, key in view_refs()})
+    new_index = {old: new for new, old in enumerate(used)}
+    for container, key in list(view_refs()):
+        container[key] = new_index[container[key]]
+    compacted = bytearray()
+    document["bufferViews"] = []
+    for i in used:
+        view = dict(views[i])
+        data = binary[view["byteOffset"]:view["byteOffset"]
+                      + view["byteLength"]]
+        compacted.extend(b"\0" * (_align(len(compacted)) - len(compacted)))
+        view["byteOffset"] = len(compacted)
+        compacted.extend(data)
+        document["bufferViews"].append(view)
+    if not document["bufferViews"]:
+        del document["bufferViews"]
+    _set_buffer(document, compacted)
+    return document, compacted
+
+
+def triangle_count(document: dict) -> int:
+    """Number of triangles of the meshes of a glTF document."""
+    return sum(
+        _triangle_count(document, primitive)
+        for mesh in document.get("meshes", [])
+        for primitive in mesh["primitives"]
+    )
@@ -0,0 +1,186 @@
+"""Gridded data of heat map and surface plots.
+
+Heat maps and surfaces take a 2D grid of values. The babyplots library
+draws the rows of the grid along the x axis (labeled by the "colnames"
+option of heat maps) and the columns along the z axis (labeled by
+"rownames"). Large grids, e.g. elevation models or expression matrices,
+can be reduced to a maximum resolution by averaging blocks of neighbouring
+cells; the labels of a reduced axis are those of the center of each block.
+
+Long-format tables with one row per cell (x, y and z columns) are pivoted
+into a grid with numpy, without building a dense table first.
+"""
+
+from typing import List, Tuple, Union
+import numpy as np
+
+
+GRID_PLOT_TYPES = ("heatMap", "surface")
+
+
+def as_grid(values) -> np.ndarray:
+    """Converts a grid (nested list, 2D numpy array or DataFrame) to a 2D
+    numpy array."""
+    grid = np.asarray(values)
+    if grid.ndim != 2:
+        raise ValueError(
+            "heatMap and surface plots need a 2D grid of values, not an "
+            "array of shape {}.".format(grid.shape))
+    return grid
+
+
+def grid_size(max_grid: Union[int, Tuple[int, int]]) -> Tuple[int, int]:
+    """Maximum number of rows and columns, given as one number for both or
+    as a pair."""
+    if np.ndim(max_grid) == 0:
+        max_grid = (max_grid, max_grid)
+    rows, cols = (int(size) for size in max_grid)
+    if rows < 1 or cols < 1:
+        raise ValueError(
+            "max_grid must be at least 1, not {}.".format(max_grid))
+    return rows, cols
+
+
+def block_length(n: int, max_size: int) -> int:
+    """Length of the equally sized blocks that reduce an axis of length n to
+    at most max_size blocks (the last block may be smaller)."""
+    return -(-n // max_size) if n > max_size else 1
+
+
+def block_starts(n: int, max_size: int) -> np.ndarray:
+    """Start indices of the blocks that reduce an axis of length n to at
+    most max_size blocks."""
+    return np.arange(0, n, block_length(n, max_size))
+
+
+def _centers(starts: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the center elements of the blocks of an axis of length n."""
+    return (starts + np.append(starts[1:], n) - 1) // 2
+
+
+def block_labels(labels, starts: np.ndarray, n: int) -> list:
+    """The labels of the centers of the blocks of an axis."""
+    return [labels[i] for i in _centers(starts, n).tolist()]
+
+
+def block_means(grid: np.ndarray, row_starts: np.ndarray,
+                col_starts: np.ndarray) -> np.ndarray:
+    """Averages the blocks of a grid given by the start indices of the
+    blocks of its rows and columns."""
+    sums = np.add.reduceat(
+        np.add.reduceat(grid.astype(np.float64), row_starts, axis=0),
+        col_starts, axis=1)
+    rows = np.diff(np.append(row_starts, grid.shape[0]))
+    cols = np.diff(np.append(col_starts, grid.shape[1]))
+    means = sums / np.outer(rows, cols)
+    return means.astype(grid.dtype) if grid.dtype.kind == "f" else means
+
+
+def block_centers(grid: np.ndarray, row_starts: np.ndarray,
+                  col_starts: np.ndarray) -> np.ndarray:
+    """The values of the center cells of the blocks of a grid, for values
+    that can not be averaged (e.g. categories or colors)."""
+    return grid[np.ix_(
+        _centers(row_starts, grid.shape[0]),
+        _centers(col_starts, grid.shape[1]))]
+
+
+def pivot_long(
+    x,
+    y,
+    values: List[np.ndarray],
+    max_grid: Union[int, Tuple[int, int]] = None
+) -> Tuple[List[np.ndarray], list, list, Tuple[int, int]]:
+    """Pivots long-format data (one row per grid cell) into grids.
+
+    The distinct x values (in sorted order) become the rows of the grids
+    and the distinct y values their columns. Values of rows with the same
+    x and y are averaged; cells without any row are 0.
+
+    Parameters
+    ---
+    x, y: The x and y value of each row.
+
+    values: Numerical arrays (e.g. z values and a color variable) with one
+    value per row, each of which is pivoted into a grid.
+
+    max_grid: If set, consecutive distinct x (and y) values are binned so
+    that the grids have at most this many rows and columns; Either one
+    number for both or a pair (rows, columns).
+
+    Returns
+    ---
+    The grids (one per array in values), the labels of their rows and
+    columns, i.e. the distinct x and y values (the center value of each
+    bin if max_grid is set), and the shape of the grids before binning.
+
+    """
+    x_levels, x_codes = np.unique(np.asarray(x), return_inverse=True)
+    y_levels, y_codes = np.unique(np.asarray(y), return_inverse=True)
+    x_codes = x_codes.ravel()
+    y_codes = y_codes.ravel()
+    x_starts = np.arange(len(x_levels))
+    y_starts = np.arange(len(y_levels))
+    if max_grid is not None:
+        rows, cols = grid_size(max_grid)
+        x_length = block_length(len(x_levels), rows)
+        y_length = block_length(len(y_levels), cols)
+        x_starts = np.arange(0, len(x_levels), x_length)
+        y_starts = np.arange(0, len(y_levels), y_length)
+        x_codes = x_codes // x_length
+        y_codes = y_codes // y_length
+    shape = (len(x_starts), len(y_starts))
+    cells = x_codes * shape[1] + y_codes
+    counts = np.bincount(cells, minlength=shape[0] * shape[1])
+    grids = []
+    for value in values:
+        sums = np.bincount(
+            cells, weights=np.asarray(value, dtype=np.float64),
+            minlength=len(counts))
+        grids.append((sums / np.maximum(counts, 1)).reshape(shape))
+    return (
+        grids,
+        block_labels(x_levels.tolist(), x_starts, len(x_levels)),
+        block_labels(y_levels.tolist(), y_starts, len(y_levels)),
+        (len(x_levels), len(y_levels))
+    )
+
+
+def pivot_plot(x, y, z, color_var, options: dict,
+               max_grid: Union[int, Tuple[int, int]] = None):
+    """Pivots a long-format heat map or surface into its grid.
+
+    The color variable is pivoted along with z if it has one value per
+    row, and the distinct x and y values become the "colnames" and
+    "rownames" options, unless these are given.
+
+    Returns
+    ---
+    The grid, the color variable and the options of the plot, and a
+    dictionary describing the reduction to max_grid, like
+    Babyplot._grid_plot (None if the grid was not reduced).
+
+    """
+    values = [z]
+    pivot_colors = color_var is not None and len(color_var) == len(z)
+    if pivot_colors:
+        colors = np.asarray(color_var)
+        if colors.dtype.kind not in "biuf":
+            raise ValueError(
+                "The color variable of a long-format heatMap or surface "
+                "must be numerical.")
+        values.append(colors)
+    grids, x_labels, y_labels, shape = pivot_long(x, y, values, max_grid)
+    if pivot_colors:
+        color_var = grids[1].ravel()
+    options = dict(options)
+    options.setdefault("colnames", x_labels)
+    options.setdefault("rownames", y_labels)
+    lod_info = None
+    if grids[0].shape != shape:
+        lod_info = {
+            'method': "grid",
+            'total': list(shape),
+            'kept': list(grids[0].shape)
+        }
+    return grids[0], color_var, options, lod_info
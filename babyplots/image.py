@@ -0,0 +1,179 @@
+"""Memory-bounded reading of 3d image stacks.
+
+Image stacks are read and thresholded z-slab by z-slab in their native
+dtype, so that only the pixels above the threshold are ever held in memory
+as floating point values.
+"""
+
+from typing import List
+import numpy as np
+
+
+# approximate number of bytes of the image read at once
+SLAB_BYTES = 64 * 1024 ** 2
+
+
+def _iter_tiff_slabs(image_path: str, slab_bytes: int = SLAB_BYTES):
+    """Yields the image stack as consecutive blocks of z-planes.
+
+    Uncompressed tiff files are memory-mapped, other tiff files are read page
+    by page where each page holds one z-plane. Anything else is read
+    completely with skimage.
+
+    """
+    import tifffile
+
+    try:
+        stack = tifffile.memmap(image_path, mode="r")
+    except (ValueError, tifffile.TiffFileError):
+        stack = None
+    if stack is not None:
+        step = _slab_planes(stack, slab_bytes)
+        for z in range(0, stack.shape[0], step):
+            yield np.asarray(stack[z:z + step])
+        return
+
+    try:
+        tif = tifffile.TiffFile(image_path)
+    except tifffile.TiffFileError:
+        from skimage import io
+
+        yield io.imread(image_path)
+        return
+    with tif:
+        series = tif.series[0]
+        pages = series.pages
+        if len(series.shape) > 2 and len(pages) == series.shape[0] and all(
+                page is not None for page in pages):
+            for page in pages:
+                yield page.asarray().reshape((1, ) + series.shape[1:])
+        else:
+            yield series.asarray()
+
+
+def _slab_planes(stack: np.ndarray, slab_bytes: int) -> int:
+    plane_bytes = max(stack[0].nbytes, 1) if stack.shape[0] else 1
+    return max(1, slab_bytes // plane_bytes)
+
+
+def _integer_lut(dtype: np.dtype):
+    """Float values of all possible values of a small integer dtype."""
+    from skimage.util import img_as_float
+
+    info = np.iinfo(dtype)
+    return info.min, img_as_float(np.arange(info.min, info.max + 1,
+                                            dtype=dtype))
+
+
+def read_thresholded_stack(
+    image_path: str,
+    threshold: float = 0.1,
+    channel_thresholds: List[float] = None,
+    slab_bytes: int = SLAB_BYTES
+):
+    """Reads the pixels of an image stack that are above a threshold.
+
+    Gives the same result as thresholding img_as_float(io.imread(path)), but
+    only holds a few z-planes of the image in memory at a time.
+
+    Parameters
+    ---
+    image_path: File path of the image stack.
+
+    threshold: A global threshold for all color channels.
+
+    channel_thresholds: A list of individual thresholds for each channel.
+    The global threshold is ignored if these are given.
+
+    slab_bytes: Approximate number of bytes of the image to process at once.
+
+    Returns
+    ---
+    The pixel values (float) and their flat indices in the image transposed
+    to Z, C, Y, X, the dimensions of the image and its original dtype.
+
+    """
+    vals = []
+    indices = []
+    dim = None
+    offset = 0
+    dtype = None
+    for slab in _iter_tiff_slabs(image_path, slab_bytes):
+        # if image has no color channels, adjust dimensions
+        if slab.ndim == 3:
+            slab = np.expand_dims(slab, axis=-1)
+        if dim is None:
+            dim = [slab.shape[1], slab.shape[2], slab.shape[3], 0]
+            dtype = slab.dtype
+        dim[3] += slab.shape[0]
+        # reorder dimensions to that flatten gives the same order as R
+        # equivalent; slab shape becomes z, c, y, x
+        slab = np.transpose(slab, (0, 3, 2, 1)).reshape(-1)
+        if slab.dtype.kind in "ui" and slab.dtype.itemsize <= 2:
+            slab_vals, slab_idcs = _threshold_integer(
+                slab, threshold, channel_thresholds, dim)
+        else:
+            slab_vals, slab_idcs = _threshold_float(
+                slab, threshold, channel_thresholds, dim)
+        vals.append(slab_vals)
+        indices.append(slab_idcs + offset)
+        offset += slab.size
+    if dim is None:
+        raise ValueError("'{}' contains no image data.".format(image_path))
+    return np.concatenate(vals), np.concatenate(indices), dim, dtype
+
+
+def _by_channel(slab: np.ndarray, dim: List[int]) -> np.ndarray:
+    """View of a flattened z, c, y, x slab with shape (z, c, y * x), whose
+    values can be compared with per channel values of shape (1, c, 1)."""
+    return slab.reshape(-1, dim[2], dim[0] * dim[1])
+
+
+def _threshold_integer(slab, threshold, channel_thresholds, dim):
+    """Thresholds a flattened slab of uint8/int8/uint16/int16 values.
+
+    The thresholds are translated into integer cutoffs on the lookup table
+    of img_as_float values, so that the comparisons are done on the native
+    values and only the kept values are converted to float.
+
+    """
+    imin, lut = _integer_lut(slab.dtype)
+    if channel_thresholds is None:
+        # smallest native value whose float value is above the threshold
+        cutoff = imin + np.searchsorted(lut, threshold, side="right")
+        if cutoff < imin + lut.size:
+            idcs = np.flatnonzero(slab >= cutoff)
+        else:
+            idcs = np.empty(0, dtype=np.intp)
+    else:
+        # values below their channel threshold are dropped, as are values
+        # whose float value is not positive
+        positive = imin + np.searchsorted(lut, 0, side="right")
+        cutoffs = np.full(dim[2], positive, dtype=np.int64)
+        for i, thres in enumerate(channel_thresholds):
+            cutoffs[i] = max(
+                positive, imin + np.searchsorted(lut, thres, side="left"))
+        idcs = np.flatnonzero(
+            _by_channel(slab, dim) >= cutoffs[None, :, None])
+    native = slab[idcs]
+    if imin:
+        # signed values, shifted to positions in the lookup table
+        native = native.astype(np.int32) - imin
+    return lut[native], idcs
+
+
+def _threshold_float(slab, threshold, channel_thresholds, dim):
+    """Thresholds a flattened slab by converting it with img_as_float."""
+    from skimage.util import img_as_float
+
+    slab = img_as_float(slab)
+    if channel_thresholds is None:
+        idcs = np.flatnonzero(slab > threshold)
+    else:
+        lows = np.full(dim[2], -np.inf)
+        lows[:len(channel_thresholds)] = channel_thresholds
+        by_channel = _by_channel(slab, dim)
+        keep = by_channel > 0
+        keep &= by_channel >= lows[None, :, None]
+        idcs = np.flatnonzero(keep)
+    return slab[idcs], idcs
@@ -0,0 +1,90 @@
+"""Compact keyframes of animated point clouds.
+
+The animations of the babyplots library move the points from one set of
+positions (the "animationTargets" option) to their coordinates. For
+animations through many keyframes, e.g. along a pseudotime or an RNA
+velocity field, Babyplot.add_animated_plot packs the keyframes into
+
+    - the positions of the first keyframe, which become the coordinates of
+      the plot,
+    - the changes of the positions from the first keyframe in every
+      following keyframe, as float32 values or quantized to 8 or 16 bit
+      integers with one scale factor per keyframe.
+
+Points that do not move can be left out; the indices of the moving points
+are stored once then. As all keyframes are stored relative to the first
+one, quantization errors do not add up over the keyframes. The page
+interpolates the positions between consecutive keyframes (see
+bpAddAnimation in templates/helpers.js).
+"""
+
+from typing import Tuple
+import numpy as np
+
+
+def pack_keyframes(
+    frames,
+    bits: int = None,
+    skip_static: bool = False
+) -> Tuple[np.ndarray, dict]:
+    """Packs the keyframes of an animated point cloud.
+
+    Parameters
+    ---
+    frames: The point positions in each keyframe; Array of shape
+    (keyframes, points, 3).
+
+    bits: If set, the position changes are quantized to 8 or 16 bit
+    integers. Otherwise they are stored as float32 values.
+
+    skip_static: If True, only the changes of the points that move in any
+    keyframe are stored.
+
+    Returns
+    ---
+    The positions of the first keyframe and a dictionary with the number of
+    keyframes ("frameCount"), the scale factor of each keyframe after the
+    first ("scales", 1 for float32 values), the position changes ("deltas",
+    array with one row per keyframe after the first) and, if skip_static is
+    True, the indices of the moving points ("moving").
+
+    """
+    frames = np.asarray(frames)
+    if frames.ndim != 3 or frames.shape[2] != 3:
+        raise ValueError(
+            "frames must be an array of shape (keyframes, points, 3), not "
+            "{}.".format(frames.shape))
+    if len(frames) < 2:
+        raise ValueError("An animation needs at least two keyframes.")
+    if bits not in (None, 8, 16):
+        raise ValueError("bits must be None, 8 or 16, not {}.".format(bits))
+    base = frames[0]
+    moving = None
+    if skip_static:
+        moved = np.zeros(base.shape[0], dtype=bool)
+        for frame in frames[1:]:
+            moved |= np.any(frame != base, axis=1)
+        moving = np.flatnonzero(moved).astype(np.uint32)
+    dtype = {None: np.float32, 8: np.int8, 16: np.int16}[bits]
+    start = base if moving is None else base[moving]
+    deltas = np.empty((len(frames) - 1, start.size), dtype=dtype)
+    scales = []
+    for i, frame in enumerate(frames[1:]):
+        positions = frame if moving is None else frame[moving]
+        delta = positions.astype(np.float64) - start
+        scale = 1.0
+        if bits is not None:
+            largest = np.abs(delta).max() if delta.size else 0
+            if largest > 0:
+                scale = largest / (2 ** (bits - 1) - 1)
+            delta = np.round(delta / scale)
+        deltas[i] = delta.ravel()
+        scales.append(float(scale))
+    animation = {
+        "frameCount": len(frames),
+        "scales": scales,
+        "deltas": deltas
+    }
+    if moving is not None:
+        animation["moving"] = moving
+    return base, animation
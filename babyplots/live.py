@@ -0,0 +1,265 @@
+"""Live updates of babyplots visualizations displayed in a Jupyter notebook.
+
+Updates are sent over a Jupyter comm with the target name "babyplots", which
+is registered in the notebook together with the babyplots library (see
+templates/live.js). A message has the form
+
+    {"display_id": <id>, "updates": [<update>, ...]}
+
+where each update gives the index of a plot and either the complete plot
+("plot"), or the points appended to it ("append") and/or its new color
+variable ("colorVar"). Numerical arrays are encoded as
+{"__ndarray__": <index of the message buffer>, "dtype": ..., "shape": ...}
+and sent as binary message buffers.
+"""
+
+import threading
+from time import monotonic
+from typing import Callable
+from uuid import uuid4
+import numpy as np
+
+from babyplots.encoding import buffer_encoder
+
+
+COMM_TARGET = "babyplots"
+# json types that need no conversion before sending a message
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def open_comm(target_name: str, data: dict):
+    """Opens a comm to the notebook frontend of the running ipykernel."""
+    try:
+        from comm import create_comm
+    except ImportError:
+        from ipykernel.comm import Comm
+        return Comm(target_name=target_name, data=data)
+    return create_comm(target_name=target_name, data=data)
+
+
+class LiveFigure(object):
+    """Sends changes of the plots of a displayed Babyplot to the notebook.
+
+    Changes are applied to the plots of the Babyplot object as well, so that
+    it can still be rendered or saved as usual. Update messages are sent at
+    most max_rate times per second; changes made in between are combined.
+    Use Babyplot.live() to display a visualization and create its
+    LiveFigure.
+
+    """
+
+    def __init__(
+        self,
+        baby,
+        max_rate: float = 10,
+        comm_factory: Callable[[str, dict], object] = None
+    ):
+        """
+        Parameters
+        ---
+        baby: The displayed Babyplot object.
+
+        max_rate: Maximum number of update messages per second. If None or
+        0, every change is sent immediately.
+
+        comm_factory: Function that opens the comm, given a target name and
+        the data of the opening message. Must return an object with send(data,
+        buffers) and close() methods, like ipykernel comms.
+
+        """
+        self.baby = baby
+        self.display_id = str(uuid4()).replace('-', '_')
+        self.interval = 1 / max_rate if max_rate else 0
+        factory = comm_factory or open_comm
+        self.comm = factory(COMM_TARGET, {"display_id": self.display_id})
+        # changes per plot index that were not yet sent
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._timer = None
+        self._last_send = None
+
+    def add_plot(self, *args, **kwargs):
+        """Adds a plot to the displayed visualization.
+
+        Takes the same arguments as Babyplot.add_plot().
+        """
+        with self._lock:
+            self.baby.add_plot(*args, **kwargs)
+            self._pending[len(self.baby.plots) - 1] = {"plot": True}
+        self._schedule()
+
+    def replace_plot(
+        self,
+        index: int,
+        coordinates,
+        plot_type: str,
+        color_by: str,
+        color_var,
+        options: dict = {}
+    ):
+        """Replaces a plot of the displayed visualization.
+
+        Parameters
+        ---
+        index: Position of the plot in Babyplot.plots.
+
+        The other parameters are the same as for Babyplot.add_plot().
+        """
+        with self._lock:
+            self._check_index(index)
+            self.baby.add_plot(
+                coordinates, plot_type, color_by, color_var, options)
+            self.baby.plots[index] = self.baby.plots.pop()
+            self._pending[index] = {"plot": True}
+        self._schedule()
+
+    def update_plot(self, index: int):
+        """Sends a plot of Babyplot.plots again, after it was changed in
+        place (e.g. its options)."""
+        with self._lock:
+            self._check_index(index)
+            self._pending[index] = {"plot": True}
+        self._schedule()
+
+    def append(self, index: int, coordinates, color_var):
+        """Appends data points to a plot.
+
+        Parameters
+        ---
+        index: Position of the plot in Babyplot.plots.
+
+        coordinates: The coordinates of the new data points.
+
+        color_var: The color variable of the new data points.
+        """
+        coordinates = np.asarray(coordinates)
+        with self._lock:
+            plot = self._check_index(index)
+            if "coordinates" not in plot:
+                raise ValueError(
+                    "Can not append points to a plot of type '{}'.".format(
+                        plot["plotType"]))
+            plot["coordinates"] = _concat(plot["coordinates"], coordinates)
+            plot["colorVar"] = _concat(plot["colorVar"], color_var)
+            pending = self._pending.setdefault(index, {})
+            pending["append"] = pending.get("append", 0) + len(coordinates)
+        self._schedule()
+
+    def set_colors(self, index: int, color_var):
+        """Replaces the color variable of a plot.
+
+        Parameters
+        ---
+        index: Position of the plot in Babyplot.plots.
+
+        color_var: The new color variable of all data points of the plot.
+        """
+        with self._lock:
+            plot = self._check_index(index)
+            if len(color_var) != len(plot["coordinates"]):
+                raise ValueError(
+                    "color_var has {} values, but the plot has {} data "
+                    "points.".format(len(color_var), len(plot["coordinates"])))
+            plot["colorVar"] = color_var
+            self._pending.setdefault(index, {})["colorVar"] = True
+        self._schedule()
+
+    def flush(self):
+        """Sends all changes that were not yet sent."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            buffers = []
+            encode = buffer_encoder(buffers)
+            updates = [
+                self._update(index, changes, encode)
+                for index, changes in sorted(self._pending.items())
+            ]
+            self._pending = {}
+            data = {"display_id": self.display_id, "updates": _plain(updates)}
+            self.comm.send(data=data, buffers=buffers)
+            self._last_send = monotonic()
+
+    def close(self):
+        """Sends the remaining changes and closes the comm."""
+        self.flush()
+        self.comm.close()
+
+    def _check_index(self, index: int) -> dict:
+        if not 0 <= index < len(self.baby.plots):
+            raise IndexError(
+                "There is no plot with index {}.".format(index))
+        return self.baby.plots[index]
+
+    def _schedule(self):
+        """Sends the changes now, or after the rate limit interval."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            wait = 0
+            if self._last_send is not None:
+                wait = self._last_send + self.interval - monotonic()
+            if wait > 0:
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self.flush()
+
+    def _update(self, index: int, changes: dict, encode) -> dict:
+        """Creates the update message of a plot."""
+        plot = self.baby.plots[index]
+        update = {"index": index}
+        if changes.get("plot") or "coordinates" not in plot:
+            update["plot"] = self.baby._wire_plot(plot, encode=encode)
+            return update
+        # colors of the appended points are only sent if the color variable
+        # is not sent completely anyway
+        colors = changes.get("colorVar", False)
+        n = changes.get("append", 0)
+        if n:
+            tail = {
+                "coordinates": plot["coordinates"][-n:],
+                "colorBy": plot["colorBy"],
+                "options": plot["options"]
+            }
+            if not colors:
+                tail["colorVar"] = plot["colorVar"][-n:]
+            tail = self.baby._wire_plot(tail, encode=encode)
+            update["append"] = {"coordinates": tail["coordinates"]}
+            if not colors:
+                update["append"]["colorVar"] = tail["colorVar"]
+        if colors:
+            wire = self.baby._wire_plot({
+                "colorBy": plot["colorBy"],
+                "colorVar": plot["colorVar"],
+                "options": plot["options"]
+            }, encode=encode)
+            update["colorVar"] = wire["colorVar"]
+        return update
+
+
+def _plain(value):
+    """Converts the numpy values left in a message (e.g. in the options or
+    the levels of categories) to python values, which the comm can send.
+    Lists are only copied if they hold such values."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if all(type(item) in _PLAIN_TYPES for item in value):
+            return value
+        return [_plain(item) for item in value]
+    if isinstance(value, (np.ndarray, np.generic)) or hasattr(value, "tolist"):
+        # numpy values and pandas arrays
+        return value.tolist()
+    return value
+
+
+def _concat(values, new_values):
+    """Appends values to the values of a plot (list, array or pandas)."""
+    if isinstance(values, list) and isinstance(new_values, list):
+        return values + new_values
+    return np.concatenate([np.asarray(values), np.asarray(new_values)])
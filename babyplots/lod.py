@@ -0,0 +1,243 @@
+"""Level of detail reduction of large point clouds.
+
+All methods are vectorized with numpy and return the sorted indices of the
+points to keep, so that the original order of the points is preserved.
+progressive_order instead orders all points from coarse to fine, so that
+every prefix of the ordered points is an evenly spread subsample.
+"""
+
+import numpy as np
+
+
+LOD_METHODS = ("voxel", "stratified", "random")
+
+
+def downsample(
+    coordinates: np.ndarray,
+    max_points: int,
+    method: str = "voxel",
+    categories: np.ndarray = None,
+    seed: int = 0
+) -> np.ndarray:
+    """Select at most max_points points of a point cloud.
+
+    Parameters
+    ---
+    coordinates: Array of shape (n, d) with the point coordinates.
+
+    max_points: Maximum number of points to keep.
+
+    method: Either "voxel" (keep one point per cell of a regular grid over
+    the bounding box, preserving the spatial extent of sparse regions;
+    points with missing or infinite coordinates are dropped), "stratified"
+    (keep the same fraction of points of every category, but at least one
+    point per category, or per each of the max_points largest categories if
+    there are more) or "random" (uniform random sample).
+
+    categories: Category of each point; Required for the "stratified"
+    method.
+
+    seed: Seed of the random number generator.
+
+    """
+    n = coordinates.shape[0]
+    if n <= max_points:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    if method == "voxel":
+        return _voxel_indices(coordinates, max_points, rng)
+    if method == "stratified":
+        if categories is None:
+            raise ValueError(
+                "The 'stratified' method requires categorical colors.")
+        return _stratified_indices(categories, max_points, rng)
+    if method == "random":
+        return np.sort(rng.choice(n, max_points, replace=False))
+    raise ValueError(
+        "lod must be one of {}, not '{}'.".format(LOD_METHODS, method))
+
+
+def _voxel_indices(coordinates, max_points, rng, max_iter=4):
+    finite = np.isfinite(coordinates).all(axis=1)
+    if not finite.all():
+        # points without a position can not be binned
+        rows = np.flatnonzero(finite)
+        if len(rows) <= max_points:
+            return rows
+        return rows[_voxel_indices(coordinates[rows], max_points, rng,
+                                   max_iter)]
+    n, d = coordinates.shape
+    mins = coordinates.min(axis=0)
+    span = coordinates.max(axis=0) - mins
+    span[span == 0] = 1
+    # shuffle once, so that the representative of each voxel is random
+    perm = rng.permutation(n)
+    scaled = (coordinates[perm] - mins) / span
+    res = max(1, int(max_points ** (1 / d)))
+    for _ in range(max_iter):
+        cells = np.minimum((scaled * res).astype(np.int64), res - 1)
+        keys = np.ravel_multi_index(cells.T, (res,) * d)
+        _, first = np.unique(keys, return_index=True)
+        # refine the grid while much fewer voxels than points are occupied
+        if len(first) >= 0.5 * max_points or res >= 2 ** (62 // d):
+            break
+        grown = int(res * (max_points / len(first)) ** (1 / d))
+        res = min(max(grown, res + 1), 2 ** (62 // d))
+    if len(first) > max_points:
+        first = rng.choice(first, max_points, replace=False)
+    return np.sort(perm[first])
+
+
+def category_codes(categories):
+    """Integer codes and levels of categories.
+
+    Missing values (None or NaN) form a level of their own, reported as
+    None, like in encoding.encode_categories.
+
+    """
+    import pandas as pd
+
+    if isinstance(categories, pd.Series):
+        categories = categories.array
+    if not isinstance(categories, pd.Categorical):
+        categories = np.asarray(categories)
+    try:
+        codes, levels = pd.factorize(
+            categories, sort=True, use_na_sentinel=False)
+    except TypeError:
+        # levels of types that can not be compared
+        codes, levels = pd.factorize(categories, use_na_sentinel=False)
+    levels = [
+        None if pd.isna(level) else
+        level.item() if isinstance(level, np.generic) else level
+        for level in list(levels)
+    ]
+    return np.asarray(codes, dtype=np.int64), levels
+
+
+def _stratified_indices(categories, max_points, rng):
+    n = len(categories)
+    codes = category_codes(categories)[0]
+    counts = np.bincount(codes)
+    # one point per category (the largest ones, if there are more categories
+    # than max_points), the rest is shared in proportion to the sizes
+    first = np.zeros(len(counts), dtype=np.int64)
+    first[np.argsort(-counts, kind="stable")[:max_points]] = 1
+    n_first = first.sum()
+    exact = first + (counts - first) * ((max_points - n_first) / (n - n_first))
+    quota = np.floor(exact).astype(np.int64)
+    remaining = max_points - quota.sum()
+    if remaining > 0:
+        order = np.argsort(quota - exact)
+        quota[order[:remaining]] += 1
+    quota = np.minimum(quota, counts)
+    # rank the points of each category in random order
+    perm = rng.permutation(n)
+    order = perm[np.argsort(codes[perm], kind="stable")]
+    sorted_codes = codes[order]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(n) - starts[sorted_codes]
+    return np.sort(order[rank < quota[sorted_codes]])
+
+
+def dropped_per_category(categories, keep: np.ndarray) -> dict:
+    """Count the points that were dropped from each category.
+
+    The counts are keyed by the categories as text (as in json), with
+    missing values counted as "NA".
+
+    Parameters
+    ---
+    categories: Category of each point before the reduction.
+
+    keep: Indices of the kept points.
+
+    """
+    codes, levels = category_codes(categories)
+    total = np.bincount(codes, minlength=len(levels))
+    kept = np.bincount(codes[keep], minlength=len(levels))
+    return {
+        "NA" if level is None else str(level): int(dropped)
+        for level, dropped in zip(levels, total - kept)
+    }
+
+
+def progressive_order(
+    coordinates: np.ndarray,
+    priority: np.ndarray = None,
+    bits: int = 10,
+    seed: int = 0
+) -> np.ndarray:
+    """Order the points of a point cloud from coarse to fine.
+
+    The points are sorted by their position on a z-order (Morton) curve
+    through an octree over the bounding box. Each point is assigned the
+    coarsest octree level at which it is the first point of its cell, and
+    the points are ordered by this level, in random order within a level.
+    Any prefix of the order thus covers the occupied space evenly.
+
+    Parameters
+    ---
+    coordinates: Array of shape (n, d) with the point coordinates (d <= 3).
+
+    priority: Indices of points that are placed first, e.g. one point of
+    each category, so that coarse subsamples have the full color range.
+
+    bits: Depth of the octree (bits per axis of the Morton code).
+
+    seed: Seed of the random number generator.
+
+    """
+    n, d = coordinates.shape
+    rng = np.random.default_rng(seed)
+    mins = coordinates.min(axis=0)
+    span = coordinates.max(axis=0) - mins
+    span[span == 0] = 1
+    cells = np.minimum(
+        ((coordinates - mins) / span * 2 ** bits).astype(np.int64),
+        2 ** bits - 1)
+    codes = _morton_codes(cells, bits)
+    by_code = np.argsort(codes, kind="stable")
+    sorted_codes = codes[by_code]
+    # the highest bit in which a code differs from its predecessor gives the
+    # coarsest level at which the point starts a new octree cell
+    level = np.full(n, bits + 1, dtype=np.int64)
+    differs = sorted_codes[1:] ^ sorted_codes[:-1]
+    new_cell = differs > 0
+    highest = np.zeros(n - 1, dtype=np.int64)
+    highest[new_cell] = np.floor(
+        np.log2(differs[new_cell].astype(np.float64))).astype(np.int64)
+    level[1:][new_cell] = bits - highest[new_cell] // d
+    level[0] = 0
+    point_level = np.empty(n, dtype=np.int64)
+    point_level[by_code] = level
+    if priority is not None:
+        point_level[np.asarray(priority, dtype=np.int64)] = -1
+    return np.lexsort((rng.random(n), point_level))
+
+
+def _morton_codes(cells: np.ndarray, bits: int) -> np.ndarray:
+    """Interleave the bits of integer cell coordinates of shape (n, d)."""
+    n, d = cells.shape
+    codes = np.zeros(n, dtype=np.int64)
+    for bit in range(bits):
+        for axis in range(d):
+            codes |= ((cells[:, axis] >> bit) & 1) << (bit * d + axis)
+    return codes
+
+
+def progressive_chunks(n: int, first: int) -> list:
+    """Sizes of the chunks in which n progressively ordered points are sent.
+
+    The first chunk has first points and every further chunk doubles the
+    number of points, so that rebuilding the plot with every chunk takes at
+    most about twice as long as building it once.
+
+    """
+    sizes = []
+    total = 0
+    while total < n:
+        size = min(max(first, total), n - total)
+        sizes.append(size)
+        total += size
+    return sizes
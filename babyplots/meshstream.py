@@ -0,0 +1,212 @@
+"""Packing of local mesh sequences for playback from memory.
+
+A mesh stream (Babyplot.add_mesh_stream) makes the page fetch and parse one
+mesh file per frame from a server. For sequences in which only the vertex
+positions change, Babyplot.add_mesh_frames reads the frames locally
+instead and packs them into
+
+    - the first frame as a glb model with a single mesh, which the page
+      adds as a mesh object,
+    - the vertex position changes of every following frame, quantized to 8
+      or 16 bit integers with one scale factor per frame.
+
+The deltas are taken from the quantized positions of the previous frame,
+so that quantization errors do not add up over the frames. The page
+applies them to the vertex buffer of the mesh every frameDelay
+milliseconds (see bpAddMeshFrames in templates/helpers.js).
+"""
+
+from typing import List, Tuple
+import numpy as np
+
+from babyplots.gltf import (
+    TRIANGLES, _append_accessor, read_accessor, read_gltf, write_glb)
+
+
+def _node_matrix(node: dict) -> np.ndarray:
+    """Local transformation matrix of a glTF node."""
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get("rotation", [0, 0, 0, 1])
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.array(node.get("scale", [1, 1, 1]))
+    matrix[:3, 3] = node.get("translation", [0, 0, 0])
+    return matrix
+
+
+def read_frame(path: str) -> Tuple[np.ndarray, np.ndarray, dict]:
+    """Reads the triangle meshes of a glTF file as a single mesh.
+
+    The triangle primitives of all nodes of the default scene are merged,
+    with the node transformations applied.
+
+    Returns
+    ---
+    The vertex positions (float32), the triangles (vertex indices) and the
+    material of the first primitive (None if it has none).
+
+    """
+    document, binary = read_gltf(path)
+    scenes = document.get("scenes", [])
+    if scenes:
+        roots = scenes[document.get("scene", 0)].get("nodes", [])
+    else:
+        roots = list(range(len(document.get("nodes", []))))
+    positions = []
+    triangles = []
+    material = None
+    count = 0
+    stack = [(index, np.eye(4)) for index in reversed(roots)]
+    while stack:
+        index, parent = stack.pop()
+        node = document["nodes"][index]
+        matrix = parent @ _node_matrix(node)
+        if "mesh" in node:
+            for primitive in document["meshes"][node["mesh"]]["primitives"]:
+                if primitive.get("mode", TRIANGLES) != TRIANGLES:
+                    continue
+                vertices = read_accessor(
+                    document, binary, primitive["attributes"]["POSITION"])
+                if "indices" in primitive:
+                    faces = read_accessor(
+                        document, binary, primitive["indices"]).ravel()
+                else:
+                    faces = np.arange(len(vertices))
+                positions.append(
+                    vertices @ matrix[:3, :3].T + matrix[:3, 3])
+                triangles.append(
+                    faces[:len(faces) // 3 * 3].reshape(-1, 3).astype(
+                        np.int64) + count)
+                count += len(vertices)
+                if material is None and "material" in primitive:
+                    material = document["materials"][primitive["material"]]
+        stack.extend(
+            (child, matrix) for child in reversed(node.get("children", [])))
+    if not positions:
+        raise ValueError("'{}' contains no triangle meshes.".format(path))
+    return (
+        np.concatenate(positions).astype(np.float32),
+        np.concatenate(triangles),
+        material
+    )
+
+
+def vertex_normals(positions: np.ndarray, triangles: np.ndarray):
+    """Area weighted vertex normals of a triangle mesh."""
+    corners = positions[triangles].astype(np.float64)
+    faces = np.cross(
+        corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    normals = np.column_stack([
+        np.bincount(
+            triangles.ravel(), weights=np.repeat(faces[:, k], 3),
+            minlength=len(positions))
+        for k in range(3)
+    ])
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return (normals / np.where(length > 0, length, 1)).astype(np.float32)
+
+
+def mesh_glb(positions: np.ndarray, triangles: np.ndarray, name: str,
+             material: dict = None) -> bytes:
+    """A glb model of a single mesh named name.
+
+    Textures of the material are dropped, since the merged mesh has no
+    texture coordinates.
+
+    """
+    document = {
+        "asset": {"version": "2.0", "generator": "babyplots"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "name": name}],
+        "meshes": [{"name": name, "primitives": [{"attributes": {}}]}],
+    }
+    binary = bytearray()
+    primitive = document["meshes"][0]["primitives"][0]
+    primitive["attributes"]["POSITION"] = _append_accessor(
+        document, binary, positions, "VEC3", target=34962, bounds=True)
+    primitive["attributes"]["NORMAL"] = _append_accessor(
+        document, binary, vertex_normals(positions, triangles), "VEC3",
+        target=34962)
+    dtype = np.uint16 if len(positions) < 2 ** 16 else np.uint32
+    primitive["indices"] = _append_accessor(
+        document, binary, triangles.astype(dtype).ravel(), "SCALAR",
+        target=34963)
+    if material is not None:
+        material = {
+            key: value for key, value in material.items()
+            if not key.endswith("Texture")
+        }
+        if "pbrMetallicRoughness" in material:
+            material["pbrMetallicRoughness"] = {
+                key: value
+                for key, value in material["pbrMetallicRoughness"].items()
+                if not key.endswith("Texture")
+            }
+        material.pop("extensions", None)
+        document["materials"] = [material]
+        primitive["material"] = 0
+    return write_glb(document, binary)
+
+
+def pack_frames(paths: List[str], name: str, bits: int = 16) -> dict:
+    """Reads a sequence of mesh frames and packs them.
+
+    Parameters
+    ---
+    paths: File paths of the frames (glTF or glb files), in order. All
+    frames must have the same triangles (vertex indices).
+
+    name: Name of the mesh in the glb model of the first frame, by which
+    the page finds it.
+
+    bits: Bit depth of the quantized deltas; Either 8 or 16.
+
+    Returns
+    ---
+    A dictionary with the glb model of the first frame ("glb") and the
+    packed frames ("stream"): the number of vertices and frames, the scale
+    factor of each frame and the quantized deltas (array with one row per
+    frame after the first).
+
+    """
+    if bits not in (8, 16):
+        raise ValueError("bits must be 8 or 16, not {}.".format(bits))
+    if not paths:
+        raise ValueError("No mesh frames given.")
+    dtype = np.int8 if bits == 8 else np.int16
+    limit = 2 ** (bits - 1) - 1
+    first, triangles, material = read_frame(paths[0])
+    current = first
+    scales = []
+    deltas = np.empty((len(paths) - 1, first.size), dtype=dtype)
+    for i, path in enumerate(paths[1:]):
+        positions, frame_triangles, _ = read_frame(path)
+        if positions.shape != first.shape or not np.array_equal(
+                frame_triangles, triangles):
+            raise ValueError(
+                "The mesh in '{}' has different vertices or triangles than "
+                "the mesh in '{}'.".format(path, paths[0]))
+        delta = positions.astype(np.float64) - current
+        largest = np.abs(delta).max() if delta.size else 0
+        scale = largest / limit if largest > 0 else 1.0
+        quantized = np.round(delta / scale).astype(dtype).ravel()
+        deltas[i] = quantized
+        # positions as reconstructed by the page, in float32
+        current = (
+            current + quantized.reshape(-1, 3) * scale).astype(np.float32)
+        scales.append(float(scale))
+    return {
+        "glb": mesh_glb(first, triangles, name, material),
+        "stream": {
+            "vertices": len(first),
+            "frameCount": len(paths),
+            "scales": scales,
+            "deltas": deltas
+        }
+    }
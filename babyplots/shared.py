@@ -0,0 +1,181 @@
+"""Content-addressed sharing of arrays that are used by several plots.
+
+Figures often show the same embedding several times, colored by different
+variables. Coordinates and color variables with identical content are
+identified by a digest of their data, converted only once and sent once:
+the first plot using an array carries it in its "shared" table
+{<digest>: <array in its wire format>}, and every plot refers to it as
+{"__shared__": <digest>}. The page decodes each shared array once and passes
+the same decoded array to all plots using it (see bpAddPlot in
+templates/helpers.js).
+"""
+
+import hashlib
+import json
+from typing import List
+import numpy as np
+
+
+# plot entries that are shared between plots with identical content
+SHARED_KEYS = ("coordinates", "colorVar")
+
+
+def array_digest(values, context: str = "") -> str:
+    """Digest of the content of an array (or array-like values).
+
+    Text and other object arrays are hashed as factorized integer codes and
+    their levels, without converting every value to a string.
+
+    Parameters
+    ---
+    values: A numpy array, list, pandas Series or Categorical.
+
+    context: Additional string hashed with the values, e.g. describing how
+    they are converted.
+
+    Returns
+    ---
+    The hex digest, or None if values can not be converted to an array (e.g.
+    ragged nested lists).
+
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if _is_categorical(values):
+        array, levels = _factorize(values)
+    else:
+        try:
+            array = np.asarray(values)
+        except ValueError:
+            return None
+        levels = None
+        if array.dtype.kind == "O":
+            try:
+                array, levels = _factorize(array)
+            except TypeError:
+                # unhashable values, e.g. nested lists
+                return None
+    if levels is not None:
+        digest.update("{}|levels|{}|".format(
+            context, json.dumps(levels)).encode("utf-8"))
+    array = np.ascontiguousarray(array)
+    digest.update("{}|{}|{}|".format(
+        context, array.dtype.str, array.shape).encode("utf-8"))
+    digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
+def _is_categorical(values) -> bool:
+    """Whether values are a pandas Categorical or categorical Series."""
+    return str(getattr(values, "dtype", "")) == "category"
+
+
+def _factorize(values):
+    """Integer codes and levels of categorical or object values."""
+    import pandas as pd
+
+    if isinstance(values, pd.Series):
+        values = values.array
+    if isinstance(values, pd.Categorical):
+        return (
+            np.asarray(values.codes),
+            [[type(level).__name__, str(level)]
+             for level in values.categories.tolist()]
+        )
+    codes, levels = pd.factorize(np.asarray(values, dtype=object),
+                                 use_na_sentinel=False)
+    return codes, [
+        None if level is None else
+        [type(level).__name__, str(level)] for level in levels.tolist()]
+
+
+def _signature(values):
+    """Cheap description of an array (type, shape and dtype); only arrays
+    with the same signature can have the same content."""
+    if isinstance(values, np.ndarray):
+        return ("ndarray", values.shape, values.dtype.str)
+    try:
+        return (type(values).__name__, len(values),
+                str(getattr(values, "dtype", "")))
+    except TypeError:
+        return None
+
+
+def _identity(values):
+    """Key identifying the memory of an array: numpy views of the same
+    buffer with the same layout have equal keys."""
+    if isinstance(values, np.ndarray):
+        interface = values.__array_interface__
+        return (interface["data"][0], values.shape, values.strides,
+                values.dtype.str)
+    return id(values)
+
+
+class SharedArrays(object):
+    """Digests of the arrays shared by the plots of one rendering.
+
+    Only arrays that are used by more than one plot are shared. Arrays are
+    only hashed if another plot has an array of the same type, shape and
+    dtype in a different buffer; the same array added to several plots is
+    recognized by its identity without hashing.
+
+    """
+
+    def __init__(self, plots: List[dict]):
+        """
+        Parameters
+        ---
+        plots: The plots (as stored in Babyplot.plots) whose arrays may be
+        shared.
+
+        """
+        self._digests = {}
+        # digests of the arrays that were already sent
+        self.sent = set()
+        if len(plots) < 2:
+            return
+        groups = {}
+        for plot in plots:
+            for key in SHARED_KEYS:
+                values = plot.get(key)
+                if values is None:
+                    continue
+                signature = _signature(values)
+                if signature is None:
+                    continue
+                context = key
+                if key == "colorVar":
+                    # color variables are converted depending on these
+                    context = json.dumps([
+                        key, plot["colorBy"],
+                        plot["options"].get("sortedCategories")])
+                groups.setdefault((context, signature), []).append(
+                    (plot, key, values))
+        counts = {}
+        for (context, _), entries in groups.items():
+            if len(entries) < 2:
+                continue
+            identities = {_identity(values) for _, _, values in entries}
+            cache = {}
+            for plot, key, values in entries:
+                identity = _identity(values)
+                if identity not in cache:
+                    if len(identities) == 1:
+                        # the same array in every plot: no need to hash it
+                        cache[identity] = hashlib.blake2b(
+                            "{}|{}".format(context, identity).encode("utf-8"),
+                            digest_size=16).hexdigest()
+                    else:
+                        cache[identity] = array_digest(values, context)
+                digest = cache[identity]
+                if digest is None:
+                    continue
+                self._digests.setdefault(id(plot), {})[key] = digest
+                counts[digest] = counts.get(digest, 0) + 1
+        for digests in self._digests.values():
+            for key in list(digests):
+                if counts[digests[key]] < 2:
+                    del digests[key]
+
+    def digests(self, plot: dict) -> dict:
+        """The digests of the shared arrays of a plot, by plot entry."""
+        return self._digests.get(id(plot), {})
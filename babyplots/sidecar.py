@@ -0,0 +1,229 @@
+"""Out-of-band plot data for visualizations displayed in a notebook.
+
+Instead of embedding the plot data in the notebook, each plot can be written
+to a sidecar file next to the notebook, or served by a small http server
+running in the kernel. The notebook output then only holds the urls of the
+plots, which are fetched once the visualization scrolls into view.
+
+A plot is stored in a binary format of
+
+    - the length of a json header in bytes (little endian uint32),
+    - the utf-8 encoded json header {"data": <plot>, "buffers": [...]},
+      which lists the offset and length of every binary buffer,
+    - the binary buffers, referenced in the plot as
+      {"__ndarray__": <index of the buffer>, "dtype": ..., "shape": ...}.
+
+It is read by the bpUnpack function in templates/helpers.js.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import List
+
+from babyplots.encoding import dumps
+
+
+def pack_plot(data: dict, buffers: List[memoryview]) -> bytes:
+    """Packs a plot and the buffers its arrays refer to into bytes.
+
+    Parameters
+    ---
+    data: The plot in its wire format, with arrays encoded by an encode
+    function of encoding.buffer_encoder.
+
+    buffers: The buffers collected by the encode function.
+
+    """
+    offsets = []
+    offset = 0
+    for buffer in buffers:
+        offsets.append([offset, buffer.nbytes])
+        offset += buffer.nbytes
+    header = dumps({"data": data, "buffers": offsets}).encode("utf-8")
+    return b"".join(
+        [struct.pack("<I", len(header)), header] + [
+            buffer.tobytes() for buffer in buffers])
+
+
+def content_name(packed: bytes) -> str:
+    """File name of packed plot data, derived from its content, so that
+    rendering the same plot again does not create another file."""
+    return hashlib.sha1(packed).hexdigest()[:20] + ".bpd"
+
+
+def write_sidecar(packed: bytes, data_dir: str) -> str:
+    """Writes packed plot data to data_dir and returns its file path."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, content_name(packed))
+    if not os.path.exists(path):
+        with open(path, "wb") as outfile:
+            outfile.write(packed)
+    return path
+
+
+# loopback hosts of notebooks whose origin the data server accepts
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "[::1]")
+
+# total size of the plot data kept by the data server by default
+SERVER_MAX_BYTES = 2 * 1024 ** 3
+
+
+def _is_loopback_origin(origin: str) -> bool:
+    from urllib.parse import urlsplit
+
+    try:
+        parts = urlsplit(origin)
+        host = parts.hostname
+    except ValueError:
+        return False
+    if parts.scheme not in ("http", "https") or host is None:
+        return False
+    return host in LOOPBACK_HOSTS or "[{}]".format(host) in LOOPBACK_HOSTS
+
+
+def _data_handler():
+    """Request handler class of the data server.
+
+    http.server is only imported once a server is started.
+    """
+    from http.server import BaseHTTPRequestHandler
+
+    class DataHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            packed = self.server.store.get(self.path.lstrip("/"))
+            if packed is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(packed)))
+            # the notebook is served from a different origin, which is
+            # allowed if it is on the same machine (or explicitly allowed)
+            origin = self.headers.get("Origin")
+            if origin is not None and (
+                origin in self.server.store.origins
+                or _is_loopback_origin(origin)
+            ):
+                self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Vary", "Origin")
+            self.end_headers()
+            self.wfile.write(packed)
+
+        def log_message(self, format, *args):
+            pass
+
+    return DataHandler
+
+
+class _DataStore(object):
+    """The packed plot data served by a data server.
+
+    The data of each figure is registered under an owner key and replaced
+    when the figure is rendered again. In addition, the least recently
+    used data is dropped once the total size exceeds max_bytes.
+
+    """
+
+    def __init__(self, max_bytes: int, origins: List[str]):
+        self.max_bytes = max_bytes
+        self.origins = set(origins)
+        self._data = OrderedDict()
+        self._owners = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> bytes:
+        with self._lock:
+            packed = self._data.get(name)
+            if packed is not None:
+                self._data.move_to_end(name)
+            return packed
+
+    def add(self, name: str, packed: bytes, owner=None):
+        with self._lock:
+            if name not in self._data:
+                self._bytes += len(packed)
+            self._data[name] = packed
+            self._data.move_to_end(name)
+            if owner is not None:
+                self._owners.setdefault(owner, set()).add(name)
+            while self._bytes > self.max_bytes and len(self._data) > 1:
+                _, dropped = self._data.popitem(last=False)
+                self._bytes -= len(dropped)
+
+    def release(self, owner):
+        with self._lock:
+            names = self._owners.pop(owner, set())
+            for name in names:
+                if any(name in kept for kept in self._owners.values()):
+                    # the same data is used by another figure
+                    continue
+                dropped = self._data.pop(name, None)
+                if dropped is not None:
+                    self._bytes -= len(dropped)
+
+
+class DataServer(object):
+    """Serves packed plot data over http from the kernel process.
+
+    The server only listens on the loopback interface, so it is only
+    reachable by a browser running on the same machine as the kernel, and
+    only notebooks served from a loopback host (or from one of origins) may
+    read its responses.
+
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 max_bytes: int = SERVER_MAX_BYTES, origins: List[str] = []):
+        from http.server import ThreadingHTTPServer
+
+        self._server = ThreadingHTTPServer((host, port), _data_handler())
+        self._server.store = _DataStore(max_bytes, origins)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}/".format(host, port)
+
+    def add(self, packed: bytes, owner=None) -> str:
+        """Serves packed plot data and returns its url.
+
+        Parameters
+        ---
+        packed: The packed plot data (see pack_plot()).
+
+        owner: Key of the figure the data belongs to, e.g. its id; The data
+        is dropped when release() is called with the same key.
+
+        """
+        name = content_name(packed)
+        self._server.store.add(name, packed, owner)
+        return self.url + name
+
+    def release(self, owner):
+        """Stops serving the data added for owner, e.g. before the figure is
+        rendered again with changed data."""
+        self._server.store.release(owner)
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_SERVER = None
+
+
+def data_server() -> DataServer:
+    """The data server of the kernel, started on first use."""
+    global _SERVER
+    if _SERVER is None:
+        _SERVER = DataServer()
+    return _SERVER
@@ -0,0 +1,270 @@
+"""Batched reading of the plot columns of csv, parquet and feather files.
+
+Only the columns needed for a plot are read, one batch of rows at a time,
+and collected into the coordinate array and color variable of the plot, so
+that the complete table is never held in memory as a DataFrame. Text
+columns are collected as pandas Categoricals, i.e. as integer codes and a
+table of categories.
+
+pyarrow is used if it is installed. Otherwise csv files are read in chunks
+with pandas and parquet files row group by row group with fastparquet;
+feather files can only be read with pyarrow.
+"""
+
+import os
+from typing import Iterator, List, Tuple
+import numpy as np
+
+
+TABLE_FORMATS = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".txt": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+}
+
+# number of rows read at once
+BATCH_ROWS = 1024 ** 2
+
+
+def table_format(path: str) -> str:
+    """Format of a table file ("csv", "parquet" or "feather"), given by the
+    extension of its name (ignoring a .gz or .bz2 extension of csv files)."""
+    root, ext = os.path.splitext(path.lower())
+    if ext in (".gz", ".bz2"):
+        ext = os.path.splitext(root)[1]
+    if ext not in TABLE_FORMATS:
+        raise ValueError(
+            "Can not read '{}'; supported extensions are {}.".format(
+                path, ", ".join(TABLE_FORMATS)))
+    return TABLE_FORMATS[ext]
+
+
+def _delimiter(path: str) -> str:
+    return "\t" if ".tsv" in path.lower() else ","
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _fastparquet(path: str):
+    """Opens a parquet file with fastparquet, if pyarrow is not installed."""
+    try:
+        import fastparquet
+    except ImportError:
+        raise ImportError(
+            "Reading parquet files requires pyarrow or fastparquet; install "
+            "pyarrow with: pip install babyplots[arrow]")
+    return fastparquet.ParquetFile(path)
+
+
+def _require_pyarrow(fmt: str):
+    if fmt == "feather":
+        raise ImportError(
+            "Reading feather files requires pyarrow; install it with: "
+            "pip install babyplots[arrow]")
+
+
+def table_columns(path: str) -> List[str]:
+    """Names of the columns of a table file, read from its header (or the
+    schema in the metadata of parquet files)."""
+    fmt = table_format(path)
+    pa = _pyarrow()
+    if pa is None:
+        _require_pyarrow(fmt)
+        if fmt == "parquet":
+            return list(_fastparquet(path).columns)
+        import pandas as pd
+
+        return list(pd.read_csv(path, sep=_delimiter(path), nrows=0).columns)
+    if fmt == "csv":
+        from pyarrow import csv
+
+        with csv.open_csv(path, parse_options=csv.ParseOptions(
+                delimiter=_delimiter(path))) as reader:
+            return reader.schema.names
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).names
+    if _is_ipc_file(path):
+        return _ipc_reader(path).schema.names
+    import pyarrow.feather as feather
+
+    return feather.read_table(path, memory_map=True).schema.names
+
+
+def _is_ipc_file(path: str) -> bool:
+    """Whether a feather file is an arrow ipc file (feather version 2)."""
+    with open(path, "rb") as infile:
+        return infile.read(6) == b"ARROW1"
+
+
+def _ipc_reader(path: str):
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(path, "r"))
+
+
+def iter_batches(
+    path: str,
+    columns: List[str],
+    batch_rows: int = BATCH_ROWS
+) -> Iterator[dict]:
+    """Reads the given columns of a table file batch by batch.
+
+    Yields
+    ---
+    A dictionary per batch, mapping the column names to numpy arrays
+    (numerical columns) or pandas Categoricals (text columns).
+
+    """
+    fmt = table_format(path)
+    pa = _pyarrow()
+    if pa is None:
+        yield from _iter_pandas_batches(path, fmt, columns, batch_rows)
+        return
+    if fmt == "csv":
+        from pyarrow import csv
+
+        reader = csv.open_csv(
+            path,
+            read_options=csv.ReadOptions(
+                # approximate size of a batch of rows in bytes
+                block_size=max(1024 ** 2, batch_rows * 8 * len(columns))),
+            parse_options=csv.ParseOptions(delimiter=_delimiter(path)),
+            convert_options=csv.ConvertOptions(include_columns=columns))
+        with reader:
+            for batch in reader:
+                yield _arrow_batch(batch, columns)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        with pq.ParquetFile(path) as parquet:
+            for batch in parquet.iter_batches(
+                    batch_size=batch_rows, columns=columns):
+                yield _arrow_batch(batch, columns)
+    elif _is_ipc_file(path):
+        reader = _ipc_reader(path)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield _arrow_batch(batch.select(columns), columns)
+    else:
+        import pyarrow.feather as feather
+
+        # feather version 1 files can only be read completely
+        table = feather.read_table(path, columns=columns)
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            yield _arrow_batch(batch, columns)
+
+
+def _arrow_batch(batch, columns: List[str]) -> dict:
+    import pyarrow as pa
+
+    converted = {}
+    for name in columns:
+        array = batch.column(batch.schema.get_field_index(name))
+        if pa.types.is_string(array.type) or pa.types.is_large_string(
+                array.type):
+            array = array.dictionary_encode()
+        if pa.types.is_dictionary(array.type):
+            converted[name] = array.to_pandas().array
+        else:
+            converted[name] = array.to_numpy(zero_copy_only=False)
+    return converted
+
+
+def _iter_pandas_batches(path: str, fmt: str, columns: List[str],
+                         batch_rows: int) -> Iterator[dict]:
+    import pandas as pd
+
+    _require_pyarrow(fmt)
+    if fmt == "parquet":
+        chunks = _fastparquet(path).iter_row_groups(columns=columns)
+    else:
+        chunks = pd.read_csv(
+            path, sep=_delimiter(path), usecols=columns, chunksize=batch_rows)
+    for chunk in chunks:
+        converted = {}
+        for name in columns:
+            column = chunk[name]
+            if column.dtype.kind in "biuf":
+                converted[name] = column.to_numpy()
+            else:
+                converted[name] = pd.Categorical(column)
+        yield converted
+
+
+def read_plot_columns(
+    path: str,
+    coord_columns: List[str] = [],
+    color_column: str = None,
+    batch_rows: int = BATCH_ROWS
+) -> Tuple[np.ndarray, object, int]:
+    """Reads the coordinates and color variable of a plot from a table file.
+
+    Columns are selected like in Babyplot.add_plot_from_dataframe(): if
+    coord_columns is empty, all columns except color_column are used as
+    coordinates.
+
+    Parameters
+    ---
+    path: File path of a csv, tsv, parquet or feather file.
+
+    coord_columns: Names of the coordinate columns.
+
+    color_column: Name of the column with the color variable, if any.
+
+    batch_rows: Number of rows read at once.
+
+    Returns
+    ---
+    The coordinates (as an array with one row per data point), the color
+    variable (numpy array or pandas Categorical, None if color_column is
+    None) and the number of rows.
+
+    """
+    names = table_columns(path)
+    columns = list(coord_columns) or [c for c in names if c != color_column]
+    selected = columns + ([color_column] if color_column is not None else [])
+    missing = [c for c in selected if c not in names]
+    if missing:
+        raise KeyError(
+            "Columns {} not in '{}'.".format(", ".join(missing), path))
+    blocks = []
+    colors = []
+    for batch in iter_batches(path, selected, batch_rows):
+        blocks.append(np.column_stack([batch[c] for c in columns]))
+        if color_column is not None:
+            colors.append(batch[color_column])
+    if not blocks:
+        coordinates = np.empty((0, len(columns)))
+    else:
+        coordinates = np.concatenate(blocks)
+    del blocks
+    color_var = None
+    if color_column is not None:
+        color_var = _concat_columns(colors)
+    return coordinates, color_var, len(coordinates)
+
+
+def _concat_columns(batches: list):
+    """Concatenates the batches of a column."""
+    import pandas as pd
+
+    if not batches:
+        return np.empty(0)
+    if any(isinstance(b, pd.Categorical) for b in batches):
+        from pandas.api.types import union_categoricals
+
+        # chunks of text columns with different categories
+        return union_categoricals([pd.Categorical(b) for b in batches])
+    return np.concatenate(batches)
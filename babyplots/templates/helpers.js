@@ -0,0 +1,468 @@
+function bpBytes(data) {
+  // converts a base64 string into a byte array
+  var raw = atob(data);
+  var bytes = new Uint8Array(raw.length);
+  for (var i = 0; i < raw.length; i++) {
+    bytes[i] = raw.charCodeAt(i);
+  }
+  return bytes;
+}
+
+function bpTypedArray(value) {
+  // converts a binary encoded array (see babyplots/encoding.py) into a flat
+  // typed array
+  var types = {
+    float32: Float32Array,
+    float64: Float64Array,
+    int8: Int8Array,
+    uint8: Uint8Array,
+    int16: Int16Array,
+    uint16: Uint16Array,
+    int32: Int32Array,
+    uint32: Uint32Array
+  };
+  var data = value.__ndarray__;
+  var bytes;
+  if (typeof data === "string") {
+    bytes = bpBytes(data);
+  } else {
+    // binary buffer of a comm message (see babyplots/live.py), copied to
+    // align it
+    bytes = new Uint8Array(
+      data.buffer || data, data.byteOffset || 0, data.byteLength
+    ).slice();
+  }
+  return new types[value.dtype](bytes.buffer);
+}
+
+function bpDecode(value) {
+  // decodes binary encoded, quantized, dictionary encoded and run-length
+  // encoded arrays (see babyplots/encoding.py) into plain (nested) arrays as
+  // expected by the babyplots library.
+  if (value === null || typeof value !== "object") {
+    return value;
+  }
+  if ("__quantized__" in value) {
+    var q = bpTypedArray(value.__quantized__);
+    var values = new Array(q.length);
+    for (var i = 0; i < q.length; i++) {
+      values[i] = value.offset + q[i] * value.scale;
+    }
+    return values;
+  }
+  if ("__categories__" in value) {
+    var codes = bpTypedArray(value.__categories__);
+    var categories = new Array(codes.length);
+    for (var c = 0; c < codes.length; c++) {
+      categories[c] = value.levels[codes[c]];
+    }
+    return categories;
+  }
+  if ("__runs__" in value) {
+    var starts = bpTypedArray(value.starts);
+    var lengths = bpTypedArray(value.lengths);
+    var indices = [];
+    for (var j = 0; j < starts.length; j++) {
+      for (var k = 0; k < lengths[j]; k++) {
+        indices.push(starts[j] + k);
+      }
+    }
+    return indices;
+  }
+  if (!("__ndarray__" in value)) {
+    return value;
+  }
+  var flat = bpTypedArray(value);
+  if (value.shape.length < 2) {
+    return Array.prototype.slice.call(flat);
+  }
+  var nrow = value.shape[0];
+  var ncol = flat.length / nrow;
+  var rows = new Array(nrow);
+  for (var r = 0; r < nrow; r++) {
+    rows[r] = Array.prototype.slice.call(flat, r * ncol, (r + 1) * ncol);
+  }
+  return rows;
+}
+
+function bpShared(vis, value) {
+  // resolves a reference to an array shared between plots (see
+  // babyplots/shared.py), which is decoded only once
+  if (value !== null && typeof value === "object" && "__shared__" in value) {
+    return vis.bpShared[value.__shared__];
+  }
+  return bpDecode(value);
+}
+
+function bpAddPlot(vis, plot) {
+  // adds a plot as stored in Babyplot.plots to the visualization. The
+  // decoded plots are kept in vis.bpPlots for live updates.
+  plot = Object.assign({}, plot);
+  vis.bpShared = vis.bpShared || {};
+  if (plot.shared !== undefined) {
+    for (var digest in plot.shared) {
+      vis.bpShared[digest] = bpDecode(plot.shared[digest]);
+    }
+    delete plot.shared;
+  }
+  if (plot.plotType === "imageStack") {
+    plot.vals = bpDecode(plot.vals);
+    plot.indices = bpDecode(plot.indices);
+    vis.addImgStack(plot.vals, plot.indices, plot.attributes, plot.options);
+  } else if (plot.plotType === "meshStream") {
+    vis.addMeshStream(
+      plot.rootUrl,
+      plot.filePrefix,
+      plot.fileSuffix,
+      plot.fileIteratorStart,
+      plot.fileIteratorEnd,
+      plot.frameDelay,
+      plot.options
+    );
+  } else if (plot.plotType === "meshObject") {
+    vis.addMeshObject(plot.meshString, plot.options);
+  } else if (plot.plotType === "meshFrames") {
+    bpAddMeshFrames(vis, plot);
+  } else {
+    var refinements = plot.refinements;
+    delete plot.refinements;
+    plot.coordinates = bpShared(vis, plot.coordinates);
+    plot.colorVar = bpShared(vis, plot.colorVar);
+    if (refinements !== undefined) {
+      // progressively rendered plot (see Babyplot(progressive=...))
+      var options = plot.options;
+      plot.options = bpSliceOptions(
+        options, plot.coordinates.length, plot.total
+      );
+    }
+    vis.addPlot(
+      plot.coordinates,
+      plot.plotType,
+      plot.colorBy,
+      plot.colorVar,
+      plot.options
+    );
+    if (plot.animation !== undefined) {
+      bpAddAnimation(vis, vis.plots[vis.plots.length - 1], plot.animation);
+    }
+  }
+  vis.bpPlots = vis.bpPlots || [];
+  vis.bpPlots.push(plot);
+  if (refinements !== undefined) {
+    bpRefine(vis, vis.bpPlots.length - 1, plot, options, refinements);
+  }
+}
+
+function bpAddMeshFrames(vis, plot) {
+  // adds the first frame of packed mesh frames (see babyplots/meshstream.py)
+  // as a mesh object and plays the following frames by updating its vertex
+  // positions every frameDelay milliseconds
+  vis.addMeshObject(plot.meshString, plot.options);
+  function play(stream) {
+    var deltas = bpTypedArray(stream.deltas);
+    var n = stream.vertices * 3;
+    var mesh = null;
+    var first;
+    var frame = 0;
+    var last = performance.now();
+    vis.scene.onBeforeRenderObservable.add(function () {
+      if (mesh === null) {
+        // the mesh is created once the model is loaded
+        var loaded = vis.scene.getMeshByName(plot.meshName);
+        if (!loaded || loaded.getTotalVertices() !== stream.vertices) {
+          return;
+        }
+        mesh = loaded;
+        first = Float32Array.from(mesh.getVerticesData("position"));
+        mesh.setVerticesData("position", Float32Array.from(first), true);
+        mesh.setVerticesData(
+          "normal", Float32Array.from(mesh.getVerticesData("normal")), true
+        );
+      }
+      var now = performance.now();
+      if (stream.frameCount < 2 || now - last < plot.frameDelay) {
+        return;
+      }
+      last = now;
+      frame = (frame + 1) % stream.frameCount;
+      mesh.updateMeshPositions(function (positions) {
+        if (frame === 0) {
+          for (var j = 0; j < n; j++) {
+            positions[j] = first[j];
+          }
+          return;
+        }
+        var scale = stream.scales[frame - 1];
+        var offset = (frame - 1) * n;
+        for (var i = 0; i < n; i++) {
+          positions[i] += deltas[offset + i] * scale;
+        }
+      }, true);
+    });
+  }
+  if (plot.streamUrl !== undefined) {
+    fetch(plot.streamUrl)
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error(
+            "Could not load babyplots mesh frames from " + response.url
+          );
+        }
+        return response.arrayBuffer();
+      })
+      .then(function (buffer) {
+        play(bpUnpack(buffer));
+      });
+  } else {
+    play(plot.stream);
+  }
+}
+
+function bpAddAnimation(vis, cloud, animation) {
+  // plays the packed keyframes of an animated point cloud (see
+  // babyplots/keyframes.py) by interpolating the positions of the moving
+  // points between consecutive keyframes
+  var deltas = bpTypedArray(animation.deltas);
+  var moving =
+    animation.moving === undefined ? null : bpTypedArray(animation.moving);
+  var first = Float32Array.from(cloud.mesh.getVerticesData("position"));
+  var count = moving === null ? first.length / 3 : moving.length;
+  var stride = count * 3;
+  var axisScales = [cloud.xScale, cloud.yScale, cloud.zScale];
+  var segments = animation.frameCount - 1;
+  var start = null;
+  var done = false;
+  vis.scene.onBeforeRenderObservable.add(function () {
+    var now = performance.now();
+    if (start === null) {
+      start = now;
+    }
+    var t =
+      Math.max(now - start - animation.delay, 0) / animation.frameDuration;
+    if (animation.loop) {
+      // back and forth, like the animations of the babyplots library
+      t = t % (2 * segments);
+      if (t > segments) {
+        t = 2 * segments - t;
+      }
+    } else if (t >= segments) {
+      if (done) {
+        return;
+      }
+      done = true;
+      t = segments;
+    }
+    // interpolate between keyframes k and k + 1; the deltas of keyframe k
+    // (relative to the first keyframe) start at (k - 1) * stride
+    var k = Math.min(Math.floor(t), segments - 1);
+    var f = t - k;
+    var from = k > 0 ? (1 - f) * animation.scales[k - 1] : 0;
+    var to = f * animation.scales[k];
+    var fromOffset = (k - 1) * stride;
+    var toOffset = k * stride;
+    cloud.mesh.updateMeshPositions(function (positions) {
+      for (var j = 0; j < count; j++) {
+        var p = (moving === null ? j : moving[j]) * 3;
+        for (var a = 0; a < 3; a++) {
+          var i = j * 3 + a;
+          var delta = to * deltas[toOffset + i];
+          if (from !== 0) {
+            delta += from * deltas[fromOffset + i];
+          }
+          positions[p + a] = first[p + a] + delta * axisScales[a];
+        }
+      }
+    }, false);
+  });
+}
+
+function bpSliceOptions(options, n, total) {
+  // restricts the per data point options to the first n of total points
+  var sliced = Object.assign({}, options);
+  ["labels", "dpInfo"].forEach(function (key) {
+    if (Array.isArray(sliced[key]) && sliced[key].length === total) {
+      sliced[key] = sliced[key].slice(0, n);
+    }
+  });
+  if (
+    Array.isArray(sliced.animationTargets) &&
+    sliced.animationTargets.length === total
+  ) {
+    // the start positions of the points
+    sliced.animationTargets = sliced.animationTargets.slice(0, n);
+  }
+  return sliced;
+}
+
+function bpRefine(vis, index, plot, options, refinements) {
+  // adds the refinement chunks of a progressively rendered plot, one chunk
+  // per animation frame, so that the coarser plot is shown in between
+  function next(callback) {
+    if (window.requestAnimationFrame) {
+      window.requestAnimationFrame(callback);
+    } else {
+      setTimeout(callback, 0);
+    }
+  }
+  var k = 0;
+  function step() {
+    if (k >= refinements.length) {
+      return;
+    }
+    var chunk = refinements[k++];
+    var current = vis.bpPlots[index];
+    var refined = Object.assign({}, current);
+    refined.coordinates = current.coordinates.concat(
+      bpDecode(chunk.coordinates)
+    );
+    if (chunk.colorVar !== undefined) {
+      refined.colorVar = current.colorVar.concat(bpDecode(chunk.colorVar));
+    }
+    refined.options = bpSliceOptions(
+      options, refined.coordinates.length, plot.total
+    );
+    bpReplacePlot(vis, index, refined);
+    next(step);
+  }
+  next(step);
+}
+
+function bpReplacePlot(vis, index, plot) {
+  // replaces the plot at index (or adds a plot, if index is the number of
+  // plots) without moving the camera
+  var camera = vis.camera;
+  var view = [camera.alpha, camera.beta, camera.radius, camera.target.clone()];
+  var old = vis.plots[index];
+  var axesAligned = vis._axes.length === vis.plots.length;
+  bpAddPlot(vis, plot);
+  if (old !== undefined) {
+    if (old.mesh) {
+      old.mesh.dispose();
+    }
+    (old.meshes || []).forEach(function (mesh) {
+      mesh.dispose();
+    });
+    vis.plots[index] = vis.plots.pop();
+    vis.bpPlots[index] = vis.bpPlots.pop();
+    vis._downloadObj.plots[index] = vis._downloadObj.plots.pop();
+    if (axesAligned && vis._axes.length === vis.plots.length + 1) {
+      vis._axes[index].dispose();
+      vis._axes[index] = vis._axes.pop();
+    }
+    vis._updateLegend(vis.uiLayer);
+  }
+  camera.alpha = view[0];
+  camera.beta = view[1];
+  camera.radius = view[2];
+  camera.setTarget(view[3]);
+}
+
+function bpAttachBuffers(value, buffers) {
+  // replaces the buffer indices of binary encoded arrays in a comm message
+  // by the message buffers
+  if (value === null || typeof value !== "object" || Array.isArray(value)) {
+    return value;
+  }
+  var attached = {};
+  for (var key in value) {
+    attached[key] = bpAttachBuffers(value[key], buffers);
+  }
+  if (typeof value.__ndarray__ === "number") {
+    attached.__ndarray__ = buffers[value.__ndarray__];
+  }
+  return attached;
+}
+
+function bpLiveUpdate(vis, data, buffers) {
+  // applies the plot updates of a live update message (see
+  // babyplots/live.py)
+  data.updates.forEach(function (update) {
+    update = bpAttachBuffers(update, buffers);
+    var plot = update.plot;
+    if (plot === undefined) {
+      var current = vis.bpPlots[update.index];
+      plot = Object.assign({}, current);
+      if (update.append !== undefined) {
+        plot.coordinates = current.coordinates.concat(
+          bpDecode(update.append.coordinates)
+        );
+        if (update.append.colorVar !== undefined) {
+          plot.colorVar = current.colorVar.concat(
+            bpDecode(update.append.colorVar)
+          );
+        }
+      }
+      if (update.colorVar !== undefined) {
+        plot.colorVar = bpDecode(update.colorVar);
+      }
+    }
+    bpReplacePlot(vis, update.index, plot);
+  });
+}
+
+function bpInflate(data, format) {
+  // decompresses a base64 encoded gzip or deflate payload into a string
+  var stream = new Blob([bpBytes(data)]).stream().pipeThrough(
+    new DecompressionStream(format)
+  );
+  return new Response(stream).text();
+}
+
+function bpUnpack(buffer) {
+  // reads a plot in the binary format of babyplots/sidecar.py
+  var length = new DataView(buffer).getUint32(0, true);
+  var header = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, 4, length))
+  );
+  var buffers = header.buffers.map(function (b) {
+    return new DataView(buffer, 4 + length + b[0], b[1]);
+  });
+  return bpAttachBuffers(header.data, buffers);
+}
+
+function bpSourceUrl(source) {
+  // resolves the url of out-of-band plot data; relative urls are relative
+  // to the directory of the notebook, served by the notebook server
+  if (!source.relative) {
+    return source.url;
+  }
+  var notebook = window.Jupyter && Jupyter.notebook;
+  if (notebook && notebook.notebook_path !== undefined) {
+    var path = notebook.notebook_path.split("/").slice(0, -1);
+    return notebook.base_url + "files/" + path.concat([source.url]).join("/");
+  }
+  var base = document.body.getAttribute("data-base-url") || "/";
+  return base + "files/" + source.url;
+}
+
+function bpFetchWhenVisible(element, sources, callback) {
+  // fetches the out-of-band plot data once element is visible and passes
+  // the plots to callback
+  function load() {
+    Promise.all(
+      sources.map(function (source) {
+        return fetch(bpSourceUrl(source)).then(function (response) {
+          if (!response.ok) {
+            throw new Error(
+              "Could not load babyplots data from " + response.url
+            );
+          }
+          return response.arrayBuffer();
+        });
+      })
+    ).then(function (buffers) {
+      callback(buffers.map(bpUnpack));
+    });
+  }
+  if (!("IntersectionObserver" in window)) {
+    load();
+    return;
+  }
+  var observer = new IntersectionObserver(function (entries) {
+    if (entries.some(function (entry) { return entry.isIntersecting; })) {
+      observer.disconnect();
+      load();
+    }
+  });
+  observer.observe(element);
+}
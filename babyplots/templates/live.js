@@ -0,0 +1,32 @@
+(function () {
+  // receives live updates of displayed visualizations over the "babyplots"
+  // comm (see babyplots/live.py). Visualizations register themselves with
+  // window.bpLive.register once they are created; messages that arrive
+  // earlier are kept until then.
+  {% include 'helpers.js' %}
+  var kernel = window.Jupyter && Jupyter.notebook && Jupyter.notebook.kernel;
+  if (!kernel || window.bpLive) {
+    return;
+  }
+  var figures = {};
+  var waiting = {};
+  window.bpLive = {
+    register: function (id, vis) {
+      figures[id] = vis;
+      (waiting[id] || []).forEach(function (msg) {
+        bpLiveUpdate(vis, msg.content.data, msg.buffers);
+      });
+      delete waiting[id];
+    }
+  };
+  kernel.comm_manager.register_target("babyplots", function (comm) {
+    comm.on_msg(function (msg) {
+      var id = msg.content.data.display_id;
+      if (id in figures) {
+        bpLiveUpdate(figures[id], msg.content.data, msg.buffers);
+      } else {
+        (waiting[id] = waiting[id] || []).push(msg);
+      }
+    });
+  });
+})();
@@ -0,0 +1,359 @@
+"""Benchmarks of the serialization and export hot paths of babyplots.
+
+Every benchmark case runs in a fresh python process, so that the reported
+peak memory (resident set size) belongs to that case alone. The results are
+written to a json file in benchmarks/results, named after the babyplots
+version and git revision of the source tree, so that runs of different
+versions can be compared:
+
+    python benchmarks/run.py                     # all cases and sizes
+    python benchmarks/run.py --sizes 1e3 1e5 --cases as_json as_html
+    python benchmarks/run.py --binary            # with binary encoding
+    python benchmarks/run.py compare results/a.json results/b.json
+
+The import check guards the startup time of babyplots: it fails (exit code
+1) if importing babyplots takes longer than the budget, or if it imports any
+of the dependencies that are only needed by some methods:
+
+    python benchmarks/run.py import_check --budget 0.5
+
+Only numpy, pandas and the dependencies of babyplots are needed; nothing is
+downloaded.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(HERE, "results")
+
+CASES = (
+    "import",
+    "add_plot",
+    "add_plot_from_dataframe",
+    "add_tiff",
+    "_to_dict",
+    "as_json",
+    "as_html",
+    "_repr_html_",
+)
+SIZES = (1e3, 1e4, 1e5, 1e6, 1e7)
+
+# dependencies that must not be imported by "import babyplots"
+LAZY_MODULES = ("pandas", "skimage", "IPython", "jinja2", "http.server")
+IMPORT_BUDGET = 0.5
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import babyplots
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+def _points(n: int):
+    import numpy as np
+
+    rng = np.random.default_rng(42)
+    coordinates = rng.normal(size=(n, 3))
+    categories = rng.choice(
+        ["cluster {}".format(i) for i in range(20)], size=n)
+    return coordinates, categories
+
+
+def _setup(case: str, n: int, binary: bool, tmpdir: str):
+    """Prepares the data for a case and returns the function to time."""
+    if case == "import":
+        return lambda: __import__("babyplots"), None
+
+    import numpy as np
+    import pandas as pd
+    from babyplots import Babyplot
+
+    if case != "add_tiff":
+        coordinates, categories = _points(n)
+
+    if case == "add_plot":
+        def run():
+            bp = Babyplot(binary=binary)
+            bp.add_plot(coordinates, "pointCloud", "categories", categories)
+            return bp
+        return run, None
+
+    if case == "add_plot_from_dataframe":
+        df = pd.DataFrame(coordinates, columns=["x", "y", "z"])
+        df["cluster"] = categories
+
+        def run():
+            bp = Babyplot(binary=binary)
+            bp.add_plot_from_dataframe(
+                df, "pointCloud", "categories", "cluster")
+            return bp
+        return run, None
+
+    if case == "add_tiff":
+        import tifffile
+
+        # uint8 stack with about n voxels, of which ~half pass the threshold;
+        # at least two planes, as a single page is read as a 2D image
+        planes = max(2, int(np.ceil(n / 256 ** 2)))
+        side = 256 if n >= 2 * 256 ** 2 else max(1, int(np.sqrt(n / planes)))
+        rng = np.random.default_rng(42)
+        path = os.path.join(tmpdir, "stack.tif")
+        # written plane by plane to keep the peak memory of the setup low
+        with tifffile.TiffWriter(path) as tif:
+            for _ in range(planes):
+                tif.write(
+                    rng.integers(0, 255, size=(side, side), dtype=np.uint8),
+                    contiguous=True)
+
+        def run():
+            bp = Babyplot(binary=binary)
+            bp.add_tiff(path, threshold=0.5)
+            return bp
+        return run, None
+
+    bp = Babyplot(binary=binary)
+    bp.add_plot(coordinates, "pointCloud", "categories", categories)
+    if case == "_to_dict":
+        return bp._to_dict, None
+    if case == "as_json":
+        return bp.as_json, len
+    if case == "as_html":
+        return bp.as_html, len
+    if case == "_repr_html_":
+        return bp._repr_html_, len
+    raise ValueError("Unknown case '{}'.".format(case))
+
+
+def _run_case(case: str, n: int, binary: bool, repeat: int) -> dict:
+    """Runs one case in the current process."""
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        run, size_of = _setup(case, n, binary, tmpdir)
+        setup_rss = _peak_rss_mb()
+        times = []
+        for _ in range(repeat):
+            output = None
+            start = time.perf_counter()
+            output = run()
+            times.append(time.perf_counter() - start)
+        peak_rss = _peak_rss_mb()
+    return {
+        "seconds": min(times),
+        "setup_rss_mb": setup_rss,
+        "peak_rss_mb": peak_rss,
+        "output_bytes": (
+            len(output.encode("utf-8")) if size_of is not None else None),
+    }
+
+
+def _spawn(case: str, n: int, binary: bool, repeat: int,
+           timeout: float) -> dict:
+    """Runs one case in a fresh python process and returns its result."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        result_path = tmp.name
+    cmd = [
+        sys.executable, os.path.realpath(__file__), "_child",
+        case, str(n), str(int(binary)), str(repeat), result_path
+    ]
+    try:
+        proc = subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            timeout=timeout)
+        if proc.returncode != 0:
+            error = proc.stderr.decode("utf-8", "replace").strip()
+            return {"error": error.splitlines()[-1] if error else "failed"}
+        with open(result_path) as infile:
+            return json.load(infile)
+    except subprocess.TimeoutExpired:
+        return {"error": "timeout after {}s".format(timeout)}
+    finally:
+        os.remove(result_path)
+
+
+def _version() -> str:
+    """Version of the benchmarked babyplots source tree."""
+    with open(os.path.join(ROOT, "setup.py")) as infile:
+        match = re.search(r'version="([^"]+)"', infile.read())
+    return match.group(1) if match else "unknown"
+
+
+def _git_revision() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return out.stdout.decode().strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def run_benchmarks(args):
+    version = _version()
+    revision = _git_revision()
+    results = {
+        "version": version,
+        "revision": revision,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "binary": args.binary,
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+        },
+        "results": [],
+    }
+    for case in args.cases:
+        sizes = [0] if case == "import" else [int(s) for s in args.sizes]
+        for n in sizes:
+            # imports are cached after the first repetition
+            repeat = args.repeat if 0 < n <= 1e5 else 1
+            result = _spawn(case, n, args.binary, repeat, args.timeout)
+            result.update({"case": case, "n": n})
+            results["results"].append(result)
+            if "error" in result:
+                print("{:<25} {:>10}  {}".format(case, n, result["error"]))
+            else:
+                print("{:<25} {:>10}  {:9.4f} s  {:8.1f} MB  {}".format(
+                    case, n, result["seconds"],
+                    result["peak_rss_mb"] - result["setup_rss_mb"],
+                    "" if result["output_bytes"] is None
+                    else "{} bytes".format(result["output_bytes"])))
+
+    os.makedirs(args.output, exist_ok=True)
+    name = "{}_{}{}.json".format(
+        version, revision, "_binary" if args.binary else "")
+    path = os.path.join(args.output, name)
+    with open(path, "w") as outfile:
+        json.dump(results, outfile, indent=2)
+    print("Results written to {}".format(path))
+
+
+def import_check(args) -> bool:
+    """Times "import babyplots" in fresh processes and checks that none of
+    the LAZY_MODULES are imported."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    times = []
+    for _ in range(args.repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT], env=env,
+            stdout=subprocess.PIPE, check=True)
+        result = json.loads(proc.stdout.decode("utf-8"))
+        times.append(result["seconds"])
+    imported = [
+        name for name in LAZY_MODULES if name in result["modules"]]
+    seconds = min(times)
+    print("import babyplots: {:.4f} s (budget {:.4f} s)".format(
+        seconds, args.budget))
+    ok = True
+    if seconds > args.budget:
+        print("FAILED: import takes longer than the budget")
+        ok = False
+    if imported:
+        print("FAILED: imported at startup: {}".format(", ".join(imported)))
+        ok = False
+    return ok
+
+
+def compare(args):
+    """Prints the ratio of the results of two runs (new / old)."""
+    with open(args.old) as infile:
+        old = json.load(infile)
+    with open(args.new) as infile:
+        new = json.load(infile)
+    old_results = {(r["case"], r["n"]): r for r in old["results"]}
+    print("{} ({}) -> {} ({})".format(
+        old["version"], old["revision"], new["version"], new["revision"]))
+    print("{:<25} {:>10} {:>10} {:>10} {:>10}".format(
+        "case", "n", "time", "memory", "bytes"))
+
+    def ratio(key, a, b):
+        if a.get(key) is None or b.get(key) is None or not a[key]:
+            return "-"
+        return "{:.2f}x".format(b[key] / a[key])
+
+    for result in new["results"]:
+        previous = old_results.get((result["case"], result["n"]))
+        if previous is None or "error" in previous or "error" in result:
+            continue
+        for r in (previous, result):
+            r["rss_delta_mb"] = r["peak_rss_mb"] - r["setup_rss_mb"]
+        print("{:<25} {:>10} {:>10} {:>10} {:>10}".format(
+            result["case"], result["n"],
+            ratio("seconds", previous, result),
+            ratio("rss_delta_mb", previous, result),
+            ratio("output_bytes", previous, result)))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "_child":
+        case, n, binary, repeat, result_path = sys.argv[2:]
+        result = _run_case(case, int(n), bool(int(binary)), int(repeat))
+        with open(result_path, "w") as outfile:
+            json.dump(result, outfile)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command")
+    parser.add_argument(
+        "--cases", nargs="+", default=list(CASES), choices=CASES)
+    parser.add_argument(
+        "--sizes", nargs="+", type=float, default=list(SIZES),
+        help="numbers of data points")
+    parser.add_argument(
+        "--binary", action="store_true",
+        help="use the binary encoding of the plot data")
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="repetitions of cases up to 1e5 points (the fastest is kept)")
+    parser.add_argument(
+        "--timeout", type=float, default=1800,
+        help="seconds after which a case is aborted")
+    parser.add_argument("--output", default=RESULTS_DIR)
+    compare_parser = subparsers.add_parser(
+        "compare", help="compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    check_parser = subparsers.add_parser(
+        "import_check", help="check the import time of babyplots")
+    check_parser.add_argument(
+        "--budget", type=float, default=IMPORT_BUDGET,
+        help="maximum seconds for importing babyplots")
+    check_parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="number of imports (the fastest is kept)")
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args)
+    elif args.command == "import_check":
+        sys.exit(0 if import_check(args) else 1)
+    else:
+        run_benchmarks(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -22,8 +22,15 @@ setuptools.setup(
         "scikit-image",
         "ipython",
         "jinja2",
-        "pandas"
+        "pandas>=1.5"
     ],
-    python_requires='>=3.6',
+    extras_require={
+        "fast": ["orjson"],
+        "arrow": ["pyarrow"]
+    },
+    entry_points={
+        "console_scripts": ["babyplots = babyplots.cli:main"]
+    },
+    python_requires='>=3.8',
     include_package_data=True
 )
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""Regression tests of the startup of "import babyplots".
+
+Uses the import script and limits of the benchmark suite
+(benchmarks/run.py), in fresh python processes.
+"""
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def _benchmarks():
+    spec = importlib.util.spec_from_file_location(
+        "benchmarks_run", os.path.join(ROOT, "benchmarks", "run.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _import_babyplots(script: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    proc = subprocess.run(
+        [sys.executable, "-c", script], env=env, stdout=subprocess.PIPE,
+        check=True)
+    return json.loads(proc.stdout.decode("utf-8"))
+
+
+def test_lazy_modules_not_imported():
+    run = _benchmarks()
+    modules = _import_babyplots(run._IMPORT_SCRIPT)["modules"]
+    imported = [name for name in run.LAZY_MODULES if name in modules]
+    assert imported == []
+
+
+def test_import_within_budget():
+    run = _benchmarks()
+    seconds = min(
+        _import_babyplots(run._IMPORT_SCRIPT)["seconds"] for _ in range(3))
+    assert seconds <= run.IMPORT_BUDGET